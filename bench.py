@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Benchmark YashBot's backends: end-to-end latency, time to first token,
+tokens/sec and memory.
+
+Online requests go to a local mock OpenRouter server, offline requests to a
+stub model with a fixed prefill time and token rate (or the real gguf with
+--real-model), so runs are repeatable and need no network or API key.
+
+    python bench.py --out bench_results.json --baseline bench_baseline.json
+"""
+import argparse
+import contextlib
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+# Measure the backends themselves, not the cache or a growing conversation
+os.environ["YASHBOT_CACHE"] = "0"
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Lower is better for everything except throughput
+HIGHER_IS_BETTER = {"tokens_per_sec"}
+COMPARED = ("latency_p50", "latency_p95", "latency_p99", "ttft_p50", "ttft_p95",
+            "tokens_per_sec", "rss_peak_mb")
+
+class StubModel:
+    """
+    Stands in for GPT4All: waits `prefill` seconds, then produces
+    reply_tokens tokens at token_rate per second through the callback.
+    """
+
+    def __init__(self, token_rate=50.0, prefill=0.05, reply_tokens=64):
+        self.token_rate = token_rate
+        self.prefill = prefill
+        self.reply_tokens = reply_tokens
+        self.model = SimpleNamespace(context=None)
+
+    @contextlib.contextmanager
+    def chat_session(self, system_prompt=None):
+        self.model.context = SimpleNamespace(n_past=len(system_prompt or "") // 4)
+        try:
+            yield self
+        finally:
+            self.model.context = None
+
+    def generate(self, prompt, max_tokens=200, callback=None, **kwargs):
+        context = self.model.context
+        time.sleep(self.prefill)
+        tokens = []
+        for i in range(min(max_tokens, self.reply_tokens)):
+            time.sleep(1 / self.token_rate)
+            token = " token"
+            if context is not None:
+                context.n_past += 1
+            if callback is not None and not callback(i, token):
+                break
+            tokens.append(token)
+        return "".join(tokens)
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    # Nearest-rank percentile
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
+class RssSampler:
+    """Tracks peak resident memory of this process while a backend runs."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        if psutil is None:
+            import resource
+            # ru_maxrss is KiB on Linux, bytes on macOS
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return rss if sys.platform == "darwin" else rss * 1024
+        return psutil.Process().memory_info().rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.sample())
+
+    def __enter__(self):
+        self.peak = self.sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.sample())
+
+def timed_request(chat_stream, prompt):
+    """Run one streamed request; returns (latency, ttft, tokens, error)."""
+    start = time.perf_counter()
+    first = None
+    tokens = 0
+    text = []
+    for chunk in chat_stream(prompt, remember=False):
+        if first is None:
+            first = time.perf_counter()
+        tokens += 1
+        text.append(chunk)
+    end = time.perf_counter()
+    reply = "".join(text)
+    error = reply if reply.startswith("⚠") else None
+    return end - start, (first or end) - start, tokens, error
+
+def run_backend(name, requests, concurrency, warmup):
+    from core.backends import get_backend
+    chat_stream = get_backend(name, stream=True)
+    prompts = [f"Benchmark question number {i}?" for i in range(requests)]
+
+    for i in range(warmup):
+        timed_request(chat_stream, f"Warm-up question {i}?")
+
+    with RssSampler() as rss, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        results = list(pool.map(lambda p: timed_request(chat_stream, p), prompts))
+        wall = time.perf_counter() - start
+
+    ok = [r for r in results if r[3] is None]
+    latencies = [r[0] for r in ok]
+    ttfts = [r[1] for r in ok]
+    tokens = sum(r[2] for r in ok)
+    return {
+        "requests": requests,
+        "errors": len(results) - len(ok),
+        "latency_p50": percentile(latencies, 0.50),
+        "latency_p95": percentile(latencies, 0.95),
+        "latency_p99": percentile(latencies, 0.99),
+        "ttft_p50": percentile(ttfts, 0.50),
+        "ttft_p95": percentile(ttfts, 0.95),
+        "ttft_p99": percentile(ttfts, 0.99),
+        "tokens_per_sec": tokens / wall if wall else 0.0,
+        "requests_per_sec": len(results) / wall if wall else 0.0,
+        "rss_peak_mb": rss.peak / 2**20,
+    }
+
+def compare(results, baseline, tolerance):
+    """Return a list of (backend, metric, old, new, change) that got worse by more than tolerance."""
+    regressions = []
+    for backend, metrics in results["results"].items():
+        old_metrics = baseline.get("results", {}).get(backend)
+        if not old_metrics:
+            continue
+        for metric in COMPARED:
+            old, new = old_metrics.get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            if worse > tolerance:
+                regressions.append((backend, metric, old, new, change))
+    return regressions
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def print_table(results):
+    print(f"{'backend':<9} {'p50':>8} {'p95':>8} {'p99':>8} {'ttft50':>8} {'ttft95':>8} {'tok/s':>8} {'rss MB':>8} {'err':>4}")
+    for backend, m in results["results"].items():
+        cells = [m["latency_p50"], m["latency_p95"], m["latency_p99"], m["ttft_p50"], m["ttft_p95"]]
+        ms = " ".join(f"{c * 1000:8.1f}" if c is not None else f"{'-':>8}" for c in cells)
+        print(f"{backend:<9} {ms} {m['tokens_per_sec']:8.1f} {m['rss_peak_mb']:8.1f} {m['errors']:4d}")
+    print("(latencies in ms)")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark YashBot's online and offline backends")
+    parser.add_argument("--backends", default="online,offline", help="comma-separated (default: online,offline)")
+    parser.add_argument("--requests", type=int, default=50, help="measured requests per backend")
+    parser.add_argument("--warmup", type=int, default=3, help="unmeasured requests first")
+    parser.add_argument("--concurrency", type=int, default=1, help="requests in flight at once")
+    parser.add_argument("--reply-tokens", type=int, default=64, help="tokens per reply (mock and stub)")
+
+    online = parser.add_argument_group("online (mock OpenRouter)")
+    online.add_argument("--latency", type=float, default=0.05, help="seconds before the first token")
+    online.add_argument("--token-rate", type=float, default=200.0, help="tokens per second")
+    online.add_argument("--error-rate", type=float, default=0.0, help="fraction of 503 replies")
+
+    offline = parser.add_argument_group("offline (stub model)")
+    offline.add_argument("--offline-prefill", type=float, default=0.05, help="stub prompt-eval seconds")
+    offline.add_argument("--offline-token-rate", type=float, default=100.0, help="stub tokens per second")
+    offline.add_argument("--real-model", action="store_true", help="use the real gguf instead of the stub")
+
+    report = parser.add_argument_group("results")
+    report.add_argument("--out", default="bench_results.json", help="where to write results")
+    report.add_argument("--baseline", help="results file to compare against")
+    report.add_argument("--save-baseline", action="store_true", help="also write the results to --baseline")
+    report.add_argument("--tolerance", type=float, default=0.10,
+                        help="allowed relative slowdown before flagging (default: 0.10)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    settings = {k: v for k, v in vars(args).items() if k not in ("out", "baseline", "save_baseline")}
+
+    if "online" in backends:
+        from mock_openrouter import MockOpenRouter
+        server = MockOpenRouter(latency=args.latency, error_rate=args.error_rate,
+                                token_rate=args.token_rate, reply_tokens=args.reply_tokens).start()
+        os.environ["OPENROUTER_BASE_URL"] = server.base_url
+        os.environ["OPENROUTER_API_KEY"] = "bench"
+        # Errors should show up in the numbers, not be retried away
+        os.environ.setdefault("OPENROUTER_RETRIES", "0")
+        # The mock has no quota; don't pace it like the free tier
+        os.environ.setdefault("OPENROUTER_RATE_LIMIT", "0")
+
+    if "offline" in backends and not args.real_model:
+        os.environ["YASHBOT_OFFLINE_WORKERS"] = "0"
+        import models.llm_interface as llm
+        llm.model = StubModel(args.offline_token_rate, args.offline_prefill, args.reply_tokens)
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "host": platform.node(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "settings": settings,
+        },
+        "results": {},
+    }
+    for backend in backends:
+        print(f"⏱ {backend}: {args.requests} requests...", file=sys.stderr)
+        results["results"][backend] = run_backend(backend, args.requests, args.concurrency, args.warmup)
+
+    print_table(results)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"📝 Results written to {args.out}")
+
+    if not args.baseline:
+        return 0
+    if args.save_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"📌 Baseline saved to {args.baseline}")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    if not regressions:
+        print(f"✅ No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+        return 0
+    for backend, metric, old, new, change in regressions:
+        print(f"❌ {backend} {metric}: {old:.4g} → {new:.4g} ({change:+.1%})")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,373 @@
+# chat_view.py
+
+import datetime
+import sqlite3
+import time
+from dataclasses import dataclass, field
+
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QPoint, QRect, QRectF, QSize, QTimer
+from PyQt5.QtGui import QColor, QFont, QFontMetrics, QPainter, QPainterPath
+from PyQt5.QtWidgets import QAbstractItemView, QListView, QStyledItemDelegate
+
+@dataclass
+class Message:
+    role: str       # "user", "bot" or "system"
+    text: str
+    timestamp: str = field(default_factory=lambda: datetime.datetime.now().strftime("%H:%M"))
+    id: int = 0
+
+class MessageStore:
+    """
+    Where messages go when they are paged out of the view. The default path
+    "" gives SQLite's private temporary database, deleted on close.
+    """
+
+    def __init__(self, path=""):
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS messages "
+            "(id INTEGER PRIMARY KEY, role TEXT, text TEXT, timestamp TEXT)"
+        )
+
+    def add(self, messages):
+        self.db.executemany(
+            "INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?)",
+            [(m.id, m.role, m.text, m.timestamp) for m in messages],
+        )
+        self.db.commit()
+
+    def before(self, message_id, limit):
+        """Up to `limit` messages older than message_id, oldest first."""
+        rows = self.db.execute(
+            "SELECT id, role, text, timestamp FROM messages WHERE id < ? ORDER BY id DESC LIMIT ?",
+            (message_id, limit),
+        ).fetchall()
+        return [Message(role, text, timestamp, id) for id, role, text, timestamp in reversed(rows)]
+
+    def after(self, message_id, limit):
+        """Up to `limit` messages newer than message_id, oldest first."""
+        rows = self.db.execute(
+            "SELECT id, role, text, timestamp FROM messages WHERE id > ? ORDER BY id LIMIT ?",
+            (message_id, limit),
+        ).fetchall()
+        return [Message(role, text, timestamp, id) for id, role, text, timestamp in rows]
+
+    def clear(self):
+        self.db.execute("DELETE FROM messages")
+        self.db.commit()
+
+class ChatListModel(QAbstractListModel):
+    """
+    The chat transcript as a list model. At most memory_cap messages are
+    held in memory; once the cap is reached the oldest page_size messages
+    are written to the store and dropped, so the view never lays out more
+    than memory_cap rows however long the chat gets. Scrolling to the top
+    pages older messages back in (and the newest ones out, to stay under
+    the cap); scrolling back down or appending pages them in again.
+
+    load_history() shows a saved conversation the same way: only its newest
+    page is fetched, and older pages as the user scrolls up.
+    """
+
+    MessageRole = Qt.UserRole + 1
+
+    def __init__(self, memory_cap=200, page_size=50, store=None, parent=None):
+        super().__init__(parent)
+        self.memory_cap = max(memory_cap, 2)
+        self.page_size = max(1, min(page_size, self.memory_cap - 1))
+        self.store = store or MessageStore()
+        self.messages = []      # contiguous ids, oldest first
+        self._next_id = 0
+        self._first_id = 0      # oldest message since the last clear
+        self._history = None    # (fetch, cursor) while a saved conversation has older pages
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.messages)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        message = self.messages[index.row()]
+        if role == Qt.DisplayRole:
+            return message.text
+        if role == self.MessageRole:
+            return message
+        return None
+
+    def append(self, role, text):
+        self._show_newest()
+        self._page_out()
+        message = Message(role, text, id=self._next_id)
+        self._next_id += 1
+        row = len(self.messages)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.messages.append(message)
+        self.endInsertRows()
+        return message
+
+    def update(self, message, text):
+        """Replace the text of a message (e.g. a reply that is still streaming)."""
+        message.text = text
+        row = self._row(message)
+        if row is None:
+            self.store.add([message])
+            return
+        # The row may hold a copy paged back in from the store
+        self.messages[row].text = text
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+    def _row(self, message):
+        if not self.messages:
+            return None
+        row = message.id - self.messages[0].id
+        return row if 0 <= row < len(self.messages) else None
+
+    def _page_out(self):
+        if len(self.messages) < self.memory_cap:
+            return
+        n = max(self.page_size, len(self.messages) - self.memory_cap + 1)
+        self.store.add(self.messages[:n])
+        self.beginRemoveRows(QModelIndex(), 0, n - 1)
+        del self.messages[:n]
+        self.endRemoveRows()
+
+    def has_older(self):
+        return (bool(self.messages) and self.messages[0].id > self._first_id) or self._history is not None
+
+    def load_older(self):
+        """Page the previous page_size messages back in; returns how many."""
+        if not self.has_older():
+            return 0
+        if self.messages and self.messages[0].id > self._first_id:
+            page = self.store.before(self.messages[0].id, self.page_size)
+        else:
+            page = self._fetch_history()
+        if page:
+            self.beginInsertRows(QModelIndex(), 0, len(page) - 1)
+            self.messages[:0] = page
+            self.endInsertRows()
+            self._page_out_newest()
+        return len(page)
+
+    def _page_out_newest(self):
+        n = len(self.messages) - self.memory_cap
+        if n <= 0:
+            return
+        self.store.add(self.messages[-n:])
+        self.beginRemoveRows(QModelIndex(), len(self.messages) - n, len(self.messages) - 1)
+        del self.messages[-n:]
+        self.endRemoveRows()
+
+    def has_newer(self):
+        return bool(self.messages) and self.messages[-1].id < self._next_id - 1
+
+    def load_newer(self):
+        """Page the next page_size messages back in (after load_older); returns how many."""
+        if not self.has_newer():
+            return 0
+        page = self.store.after(self.messages[-1].id, self.page_size)
+        if page:
+            n = len(self.messages) + len(page) - self.memory_cap
+            if n > 0:
+                self.store.add(self.messages[:n])
+                self.beginRemoveRows(QModelIndex(), 0, n - 1)
+                del self.messages[:n]
+                self.endRemoveRows()
+            row = len(self.messages)
+            self.beginInsertRows(QModelIndex(), row, row + len(page) - 1)
+            self.messages.extend(page)
+            self.endInsertRows()
+        return len(page)
+
+    def _show_newest(self):
+        """Swap the newest page back in if the user has scrolled far up."""
+        if not self.has_newer():
+            return
+        self.store.add(self.messages)
+        self.beginResetModel()
+        self.messages = self.store.before(self._next_id, self.page_size)
+        self.endResetModel()
+
+    def _fetch_history(self):
+        fetch, cursor = self._history
+        page, cursor = fetch(cursor, self.page_size)
+        self._history = (fetch, cursor) if cursor is not None else None
+        # Number them just below the oldest message shown
+        self._first_id -= len(page)
+        for i, message in enumerate(page):
+            message.id = self._first_id + i
+        return page
+
+    def load_history(self, fetch):
+        """
+        Replace the transcript with a saved conversation. fetch(cursor, limit)
+        returns (messages oldest first, cursor for the page before or None);
+        the first call gets cursor None and returns the newest page.
+        """
+        self.clear()
+        self._history = (fetch, None)
+        return self.load_older()
+
+    def clear(self):
+        self.beginResetModel()
+        self.messages = []
+        self.store.clear()
+        self._first_id = self._next_id
+        self._history = None
+        self.endResetModel()
+
+class BubbleDelegate(QStyledItemDelegate):
+    """Paints messages as chat bubbles. Sizes are cached per message and width."""
+
+    COLORS = {"user": "#6272a4", "bot": "#44475a"}
+    TEXT = "#f8f8f2"
+    MUTED = "#6272a4"
+    MARGIN_X, MARGIN_Y = 20, 8
+    PAD_X, PAD_Y = 15, 10
+    RADIUS = 15
+
+    def __init__(self, view):
+        super().__init__(view)
+        self.view = view
+        self._sizes = {}    # message id -> (text length, width, QSize)
+
+    def _fonts(self, option):
+        small = QFont(option.font)
+        small.setPointSizeF(max(option.font.pointSizeF() - 3, 7))
+        return option.font, small
+
+    def _text_rect(self, text, font, width):
+        max_width = max(int(width * 0.7) - 2 * self.PAD_X, 50)
+        return QFontMetrics(font).boundingRect(QRect(0, 0, max_width, 1 << 20), Qt.TextWordWrap, text or " ")
+
+    def sizeHint(self, option, index):
+        message = index.data(ChatListModel.MessageRole)
+        width = self.view.viewport().width() - 2 * self.MARGIN_X
+        cached = self._sizes.get(message.id)
+        if cached and cached[:2] == (len(message.text), width):
+            return cached[2]
+
+        font, small = self._fonts(option)
+        if message.role == "system":
+            text_height = QFontMetrics(small).boundingRect(
+                QRect(0, 0, max(width, 50), 1 << 20), Qt.AlignCenter | Qt.TextWordWrap,
+                f"{message.text} • {message.timestamp}").height()
+        else:
+            text_height = (self._text_rect(message.text, font, width).height() + 2 * self.PAD_Y
+                           + 4 + QFontMetrics(small).height())
+        size = QSize(width, text_height + 2 * self.MARGIN_Y)
+
+        if len(self._sizes) > 4096:
+            self._sizes.clear()
+        self._sizes[message.id] = (len(message.text), width, size)
+        return size
+
+    def paint(self, painter, option, index):
+        message = index.data(ChatListModel.MessageRole)
+        font, small = self._fonts(option)
+        rect = option.rect.adjusted(self.MARGIN_X, self.MARGIN_Y, -self.MARGIN_X, -self.MARGIN_Y)
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+
+        if message.role == "system":
+            painter.setFont(small)
+            painter.setPen(QColor(self.MUTED))
+            painter.drawText(rect, Qt.AlignCenter | Qt.TextWordWrap, f"{message.text} • {message.timestamp}")
+            painter.restore()
+            return
+
+        is_user = message.role == "user"
+        text_rect = self._text_rect(message.text, font, rect.width())
+        bubble = QRect(0, 0, text_rect.width() + 2 * self.PAD_X, text_rect.height() + 2 * self.PAD_Y)
+        if is_user:
+            bubble.moveTopRight(rect.topRight())
+        else:
+            bubble.moveTopLeft(rect.topLeft())
+
+        path = QPainterPath()
+        path.addRoundedRect(QRectF(bubble), self.RADIUS, self.RADIUS)
+        painter.fillPath(path, QColor(self.COLORS.get(message.role, self.COLORS["bot"])))
+        painter.setFont(font)
+        painter.setPen(QColor(self.TEXT))
+        painter.drawText(bubble.adjusted(self.PAD_X, self.PAD_Y, -self.PAD_X, -self.PAD_Y),
+                         Qt.TextWordWrap, message.text)
+
+        painter.setFont(small)
+        painter.setPen(QColor(self.MUTED))
+        time_rect = QRect(rect.left(), bubble.bottom() + 4, rect.width(), QFontMetrics(small).height())
+        painter.drawText(time_rect, Qt.AlignRight if is_user else Qt.AlignLeft, message.timestamp)
+        painter.restore()
+
+class ChatView(QListView):
+    """
+    Virtualized transcript: only visible rows are painted. Keeps following
+    new output while scrolled to the bottom, and pages older messages in
+    when scrolled to the top and newer ones when scrolled back down.
+    """
+
+    def __init__(self, model, parent=None):
+        super().__init__(parent)
+        self.setModel(model)
+        self.delegate = BubbleDelegate(self)
+        self.setItemDelegate(self.delegate)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setResizeMode(QListView.Adjust)
+        self.setSelectionMode(QAbstractItemView.NoSelection)
+        self.setFocusPolicy(Qt.NoFocus)
+        self.setUniformItemSizes(False)
+        self._follow = True
+        self.paint_seconds = 0.0    # total time spent painting, for tracing
+
+        bar = self.verticalScrollBar()
+        bar.valueChanged.connect(self._on_scroll)
+        model.rowsInserted.connect(self._on_rows_inserted)
+        model.dataChanged.connect(self._on_data_changed)
+        # Ids restart below the old ones when a saved conversation is loaded
+        model.modelReset.connect(self.delegate._sizes.clear)
+
+    def _on_scroll(self, value):
+        bar = self.verticalScrollBar()
+        model = self.model()
+        self._follow = value >= bar.maximum() - 4 and not model.has_newer()
+        if value == bar.minimum() and bar.maximum() > 0 and model.has_older():
+            QTimer.singleShot(0, lambda: self._load_page(bar.minimum(), model.load_older))
+        elif value == bar.maximum() and bar.maximum() > 0 and model.has_newer():
+            QTimer.singleShot(0, lambda: self._load_page(bar.maximum(), model.load_newer))
+
+    def _load_page(self, edge, load):
+        bar = self.verticalScrollBar()
+        if bar.value() != edge:
+            return
+        # Keep the message at the top of the viewport in place while rows
+        # are added on one end and paged out on the other
+        anchor = self.indexAt(QPoint(1, 1))
+        message = anchor.data(ChatListModel.MessageRole) if anchor.isValid() else None
+        top = self.visualRect(anchor).top() if message else 0
+        if load() and message is not None:
+            self.doItemsLayout()
+            row = self.model()._row(message)
+            if row is not None:
+                bar.setValue(bar.value() + self.visualRect(self.model().index(row)).top() - top)
+
+    def _on_rows_inserted(self, parent, first, last):
+        if first > 0 and self._follow:
+            QTimer.singleShot(0, self.scrollToBottom)
+
+    def _on_data_changed(self, top_left, bottom_right, roles=()):
+        # A streaming message grew: re-measure it (only this row's cached size is stale)
+        self.delegate.sizeHintChanged.emit(top_left)
+        if self._follow:
+            QTimer.singleShot(0, self.scrollToBottom)
+
+    def paintEvent(self, event):
+        start = time.perf_counter()
+        super().paintEvent(event)
+        self.paint_seconds += time.perf_counter() - start
+
+    def follow(self):
+        """Jump to the newest message and keep following it."""
+        self.model()._show_newest()
+        self._follow = True
+        self.scrollToBottom()
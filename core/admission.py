@@ -0,0 +1,112 @@
+# core/admission.py
+
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+
+class Rejected(Exception):
+    """A request turned away at the door; `status` is the HTTP status to answer with."""
+
+    def __init__(self, status, message, retry_after=1):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+class AdmissionQueue:
+    """
+    Lets at most max_concurrency requests run at once and queues up to
+    max_queue more. Waiting requests are granted round-robin across
+    clients, so one client's burst can't starve everyone else, and each
+    client may have at most per_client requests waiting.
+
+    A full queue is rejected with 503 and a client over its share with
+    429. A request that waits longer than `timeout` also gets 503. Each
+    rejection carries a Retry-After estimate based on recent service times.
+    """
+
+    def __init__(self, max_concurrency=1, max_queue=16, per_client=4, timeout=30.0):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.per_client = per_client
+        self.timeout = timeout
+        self.active = 0
+        self.queued = 0
+        self.served = 0
+        self.rejected = 0
+        self._waiting = OrderedDict()   # client -> deque of tickets, in round-robin order
+        self._service_time = 1.0        # moving average, seconds
+        self._lock = threading.Lock()
+
+    def _retry_after(self):
+        return max(1, math.ceil(self._service_time * (self.queued + 1) / self.max_concurrency))
+
+    def _reject(self, status, message):
+        self.rejected += 1
+        raise Rejected(status, message, self._retry_after())
+
+    def acquire(self, client):
+        """Block until the request may run; raises Rejected if it can't be queued or times out."""
+        with self._lock:
+            if self.active < self.max_concurrency and not self.queued:
+                self.active += 1
+                return
+            if self.queued >= self.max_queue:
+                self._reject(503, "server busy: request queue is full")
+            waiting = self._waiting.setdefault(client, deque())
+            if len(waiting) >= self.per_client:
+                if not waiting:
+                    del self._waiting[client]
+                self._reject(429, "too many requests queued for this client")
+            ticket = threading.Event()
+            waiting.append(ticket)
+            self.queued += 1
+
+        if ticket.wait(self.timeout):
+            return
+        with self._lock:
+            if ticket.is_set():
+                return  # granted just as the wait timed out
+            waiting = self._waiting.get(client)
+            waiting.remove(ticket)
+            if not waiting:
+                del self._waiting[client]
+            self.queued -= 1
+            self._reject(503, f"server busy: no slot within {self.timeout:g}s")
+
+    def release(self, service_time=None):
+        with self._lock:
+            self.active -= 1
+            self.served += 1
+            if service_time is not None:
+                self._service_time = 0.8 * self._service_time + 0.2 * service_time
+            # Hand freed slots to the next client in turn, one request each
+            while self.active < self.max_concurrency and self._waiting:
+                client, waiting = self._waiting.popitem(last=False)
+                ticket = waiting.popleft()
+                if waiting:
+                    self._waiting[client] = waiting  # back of the line
+                self.queued -= 1
+                self.active += 1
+                ticket.set()
+
+    def run(self, client, func, *args, **kwargs):
+        """acquire(), call func, release()."""
+        self.acquire(client)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.release(time.perf_counter() - start)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active": self.active,
+                "queued": self.queued,
+                "clients_waiting": len(self._waiting),
+                "served": self.served,
+                "rejected": self.rejected,
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+            }
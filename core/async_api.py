@@ -0,0 +1,71 @@
+# core/async_api.py
+
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from core import rate_limit
+from core.backends import get_backend
+
+# The HTTP client and the GPT4All bindings are blocking, so coroutines hand
+# them to executors. Online calls overlap freely (one thread per pooled
+# connection); the local model can only run one generation at a time.
+_online_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("OPENROUTER_POOL_SIZE", "16")),
+    thread_name_prefix="yashbot-online",
+)
+_offline_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="yashbot-offline")
+
+def _executor_for(mode):
+    return _offline_executor if mode == "offline" else _online_executor
+
+async def chat_async(prompt, mode="online", **kwargs):
+    loop = asyncio.get_running_loop()
+    chat = get_backend(mode)
+    # Carry context variables (trace, rate-limit priority) into the worker thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_executor_for(mode), functools.partial(context.run, chat, prompt, **kwargs))
+
+async def online_chat_async(prompt, model=None, remember=True):
+    return await chat_async(prompt, "online", model=model, remember=remember)
+
+async def offline_chat_async(prompt, remember=True):
+    return await chat_async(prompt, "offline", remember=remember)
+
+async def chat_many_async(prompts, concurrency=4, timeout=None, mode="online", **kwargs):
+    """
+    Run many prompts with at most `concurrency` in flight, each limited to
+    `timeout` seconds. Results come back in submission order; a failed or
+    timed-out prompt yields its exception instead of a reply. (A timed-out
+    call is abandoned, but its executor thread runs until the backend returns.)
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    # Independent prompts: don't thread them through the conversation memory
+    kwargs.setdefault("remember", False)
+
+    async def run(prompt):
+        async with semaphore:
+            try:
+                with rate_limit.priority(rate_limit.BATCH):
+                    return await asyncio.wait_for(chat_async(prompt, mode, **kwargs), timeout)
+            except Exception as e:
+                return e
+
+    return await asyncio.gather(*(run(p) for p in prompts))
+
+def chat_many(prompts, concurrency=4, timeout=None, mode="online", **kwargs):
+    """Blocking wrapper around chat_many_async for scripts and the CLI."""
+    return asyncio.run(chat_many_async(prompts, concurrency, timeout, mode, **kwargs))
+
+async def ask_models_async(prompt, models, timeout=None):
+    """Ask the same question of several OpenRouter models at once."""
+    async def run(model):
+        try:
+            return await asyncio.wait_for(online_chat_async(prompt, model=model, remember=False), timeout)
+        except Exception as e:
+            return e
+
+    results = await asyncio.gather(*(run(m) for m in models))
+    return dict(zip(models, results))
@@ -0,0 +1,105 @@
+# core/backends.py
+
+import importlib
+import threading
+import time
+
+from core.cache import cache_enabled, cached_chat, cached_stream, get_cache
+from core.coalesce import coalesced_chat, coalesced_stream, coalescing_enabled, get_coalescer
+
+# Backend name -> where to find its chat function and optional hooks.
+# Nothing is imported until the backend is first selected.
+BACKENDS = {
+    "online": {
+        "module": "core.online_model",
+        "chat":   "online_chat",
+        "stream": "online_chat_stream",
+        "cache_params": "cache_params",
+        "remember": "remember_turn",
+        "reset":  "reset_chat",
+    },
+    "offline": {
+        "module": "core.offline_model",
+        "chat":   "offline_chat",
+        "stream": "offline_chat_stream",
+        "cache_params": "cache_params",
+        "remember": "remember_turn",
+        "warm":   "warm_up",
+        "reset":  "reset_chat",
+    },
+    # Picks online or offline per prompt (see core/router.py)
+    "hybrid": {
+        "module": "core.router",
+        "chat":   "hybrid_chat",
+        "stream": "hybrid_chat_stream",
+        "reset":  "reset_chat",
+    },
+}
+
+_loaded = {}
+_lock = threading.Lock()
+
+# Seconds spent importing/initialising each backend, for --profile-startup.
+load_times = {}
+
+def _module(name):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend: {name}")
+    return importlib.import_module(BACKENDS[name]["module"])
+
+def get_backend(name, stream=False):
+    """
+    Import the backend on first use and return its chat function, or its
+    streaming variant (a generator of text chunks) if stream is True.
+    Backends that expose cache_params are wrapped with the response cache
+    unless YASHBOT_CACHE=0; replies served from the cache are still added
+    to the backend's conversation memory. Behind the cache, identical
+    one-shot requests in flight at once share one call (see
+    core/coalesce.py) unless YASHBOT_COALESCE=0.
+    """
+    if name not in _loaded:
+        with _lock:
+            if name not in _loaded:
+                start = time.perf_counter()
+                module = _module(name)
+                _loaded[name] = module
+                load_times[name] = time.perf_counter() - start
+    module = _loaded[name]
+    func = getattr(module, BACKENDS[name]["stream" if stream else "chat"])
+
+    params_name = BACKENDS[name].get("cache_params")
+    if params_name and coalescing_enabled():
+        wrap = coalesced_stream if stream else coalesced_chat
+        func = wrap(func, get_coalescer(name), getattr(module, params_name))
+    if params_name and cache_enabled():
+        wrap = cached_stream if stream else cached_chat
+        remember_name = BACKENDS[name].get("remember")
+        on_hit = getattr(module, remember_name) if remember_name else None
+        func = wrap(func, get_cache(), getattr(module, params_name), on_hit)
+    return func
+
+def _call_hook(name, hook):
+    get_backend(name)
+    func_name = BACKENDS[name].get(hook)
+    if func_name is None:
+        return None
+    return getattr(_loaded[name], func_name)()
+
+def warm_backend(name):
+    """
+    Start warming a backend in the background (e.g. loading the local model
+    while the user is still choosing a mode). Returns the thread, or None if
+    the backend has nothing to warm.
+    """
+    return _call_hook(name, "warm")
+
+def remember_backend(name, prompt, reply):
+    """Add an exchange answered elsewhere (e.g. by the other hybrid backend) to a backend's memory."""
+    get_backend(name)
+    func_name = BACKENDS[name].get("remember")
+    if func_name is not None:
+        getattr(_loaded[name], func_name)(prompt, reply)
+
+def reset_backend(name):
+    """Clear any conversation state the backend keeps between calls."""
+    _call_hook(name, "reset")
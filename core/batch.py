@@ -0,0 +1,100 @@
+# core/batch.py
+
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from core import rate_limit
+from core.backends import get_backend
+
+def completed_indices(out_path):
+    """
+    Indices already written to the output file. A line cut short by a killed
+    run is dropped so the record is processed again.
+    """
+    done = set()
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, "rb+") as f:
+        good_end = 0
+        for line in f:
+            try:
+                done.add(json.loads(line)["index"])
+            except (ValueError, KeyError):
+                break
+            good_end += len(line)
+        f.truncate(good_end)
+    return done
+
+def read_records(in_path):
+    """Yield (index, raw line) pairs one line at a time."""
+    with open(in_path, encoding="utf-8") as f:
+        for index, line in enumerate(f):
+            if line.strip():
+                yield index, line
+
+def process_record(chat, index, line, prompt_field):
+    result = {"index": index, "id": None, "response": None, "error": None}
+    start = time.perf_counter()
+    try:
+        record = json.loads(line)
+        result["id"] = record.get("id", record.get("request_id"))
+        prompt = record[prompt_field]
+        response = chat(prompt)
+        # Backends report failures as "⚠ ..." strings rather than raising
+        if response.startswith("⚠"):
+            result["error"] = response
+        else:
+            result["response"] = response
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["latency"] = round(time.perf_counter() - start, 4)
+    return result
+
+def run_batch(in_path, out_path, mode="online", workers=4, prompt_field="prompt", progress_every=100):
+    """
+    Answer every prompt in a JSONL file and append one JSON result per line
+    to out_path. Records are streamed in and out with at most 2 * workers in
+    flight; rerunning after an interruption skips records already written.
+    Returns a summary dict.
+    """
+    done = completed_indices(out_path)
+    # Batch prompts are independent of each other
+    backend_chat = get_backend(mode)
+
+    def chat(prompt):
+        # Batch prompts queue behind interactive chat for the OpenRouter quota
+        with rate_limit.priority(rate_limit.BATCH):
+            return backend_chat(prompt, remember=False)
+
+    summary = {"skipped": len(done), "processed": 0, "errors": 0}
+    start = time.perf_counter()
+
+    with open(out_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+
+        def drain(block_until):
+            nonlocal pending
+            finished, pending = wait(pending, return_when=block_until)
+            for future in finished:
+                result = future.result()
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+                summary["processed"] += 1
+                summary["errors"] += result["error"] is not None
+                if progress_every and summary["processed"] % progress_every == 0:
+                    print(f"… {summary['processed']} records, {summary['errors']} errors", file=sys.stderr)
+
+        for index, line in read_records(in_path):
+            if index in done:
+                continue
+            pending.add(pool.submit(process_record, chat, index, line, prompt_field))
+            if len(pending) >= 2 * workers:
+                drain(FIRST_COMPLETED)
+        while pending:
+            drain(FIRST_COMPLETED)
+
+    summary["elapsed"] = round(time.perf_counter() - start, 2)
+    return summary
@@ -0,0 +1,186 @@
+# core/cache.py
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from core import tracing
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "yashbot", "responses.sqlite")
+DEFAULT_TTL = 24 * 3600
+
+def normalize_prompt(prompt):
+    """Case/whitespace-insensitive form of a prompt, ignoring trailing punctuation."""
+    prompt = re.sub(r"\s+", " ", prompt.strip().lower())
+    return prompt.rstrip(" ?!.")
+
+def make_key(prompt, model, temperature, system_prompt=""):
+    raw = json.dumps([normalize_prompt(prompt), model, temperature, system_prompt])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+class ResponseCache:
+    """
+    Two-tier cache for chat completions: an in-process LRU in front of a
+    persistent SQLite table with per-entry TTL and LRU eviction.
+
+    Deterministic requests (temperature 0) never expire.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, memory_size=256, disk_size=10000, ttl=DEFAULT_TTL):
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.ttl = ttl
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " expires REAL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used)")
+        self._db.commit()
+
+    def _remember(self, key, value, expires):
+        self._memory[key] = (value, expires)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > now):
+                self._memory.move_to_end(key)
+                self.hits["memory"] += 1
+                return entry[0]
+
+            row = self._db.execute(
+                "SELECT value, expires FROM responses WHERE key = ? AND (expires IS NULL OR expires > ?)",
+                (key, now),
+            ).fetchone()
+            if row is None:
+                self._memory.pop(key, None)
+                self.misses += 1
+                return None
+
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self._remember(key, row[0], row[1])
+            self.hits["disk"] += 1
+            return row[0]
+
+    def put(self, key, value, temperature=None):
+        now = time.time()
+        expires = None if temperature == 0 else now + self.ttl
+        with self._lock:
+            self._remember(key, value, expires)
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires, last_used) VALUES (?, ?, ?, ?)",
+                (key, value, expires, now),
+            )
+            self._evict(now)
+            self._db.commit()
+
+    def _evict(self, now):
+        self._db.execute("DELETE FROM responses WHERE expires IS NOT NULL AND expires <= ?", (now,))
+        self._db.execute(
+            "DELETE FROM responses WHERE key IN ("
+            " SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.disk_size,),
+        )
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+
+    def stats(self):
+        lookups = self.hits["memory"] + self.hits["disk"] + self.misses
+        return {
+            "memory_hits": self.hits["memory"],
+            "disk_hits":   self.hits["disk"],
+            "misses":      self.misses,
+            "hit_rate":    (lookups - self.misses) / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+def cacheable(response):
+    # Error strings from the backends start with a warning sign
+    return bool(response) and not response.startswith("⚠")
+
+def cached_chat(chat, cache, params, on_hit=None):
+    """
+    Wrap a chat function with the cache. params(**kwargs) returns the
+    (model, temperature, system_prompt) the backend would use right now.
+    on_hit(prompt, response, **kwargs) is called when the cache answers.
+    """
+    def wrapper(prompt, **kwargs):
+        model, temperature, system_prompt = params(**kwargs)
+        key = make_key(prompt, model, temperature, system_prompt)
+        with tracing.span("cache") as span:
+            response = cache.get(key)
+            span.set(hit=response is not None)
+        if response is not None and on_hit:
+            on_hit(prompt, response, **kwargs)
+        if response is None:
+            response = chat(prompt, **kwargs)
+            if cacheable(response):
+                cache.put(key, response, temperature)
+        return response
+    wrapper.__name__ = chat.__name__
+    return wrapper
+
+def cached_stream(chat_stream, cache, params, on_hit=None):
+    """Streaming counterpart of cached_chat; only complete replies are stored."""
+    def wrapper(prompt, **kwargs):
+        model, temperature, system_prompt = params(**kwargs)
+        key = make_key(prompt, model, temperature, system_prompt)
+        with tracing.span("cache") as span:
+            response = cache.get(key)
+            span.set(hit=response is not None)
+        if response is not None:
+            yield response
+            if on_hit:
+                on_hit(prompt, response, **kwargs)
+            return
+        chunks = []
+        for chunk in chat_stream(prompt, **kwargs):
+            chunks.append(chunk)
+            yield chunk
+        response = "".join(chunks)
+        if cacheable(response):
+            cache.put(key, response, temperature)
+    wrapper.__name__ = chat_stream.__name__
+    return wrapper
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """Shared cache configured from YASHBOT_CACHE_* environment variables."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(
+                path=os.getenv("YASHBOT_CACHE_PATH", DEFAULT_PATH),
+                memory_size=int(os.getenv("YASHBOT_CACHE_MEMORY_SIZE", "256")),
+                disk_size=int(os.getenv("YASHBOT_CACHE_DISK_SIZE", "10000")),
+                ttl=float(os.getenv("YASHBOT_CACHE_TTL", str(DEFAULT_TTL))),
+            )
+        return _cache
+
+def cache_enabled():
+    return os.getenv("YASHBOT_CACHE", "1") != "0"
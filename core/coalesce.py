@@ -0,0 +1,194 @@
+# core/coalesce.py
+
+import contextlib
+import contextvars
+import json
+import os
+import threading
+
+from core import tracing
+from core.cache import make_key
+
+# A context manager factory set by callers that admit backend calls (the
+# server's queues). Only the call a request starts enters it: requests that
+# join a call in flight don't take a slot of their own.
+admission = contextvars.ContextVar("yashbot_admission", default=None)
+
+def _admitted():
+    admit = admission.get()
+    return admit() if admit is not None else contextlib.nullcontext()
+
+class _Flight:
+    """One backend call in progress and everything it has produced so far."""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.readers = 1        # counted on joining, so none can miss the start
+        self.abandoned = False
+        self.cond = threading.Condition()
+
+    def add(self, chunk):
+        """Store a chunk; False once every reader has gone (stop generating)."""
+        with self.cond:
+            self.chunks.append(chunk)
+            self.cond.notify_all()
+            return not self.abandoned
+
+    def finish(self, error=None):
+        with self.cond:
+            self.done = True
+            self.error = error
+            self.cond.notify_all()
+
+    def read(self):
+        """All chunks from the first one, waiting for new ones until the call ends."""
+        i = 0
+        try:
+            while True:
+                with self.cond:
+                    while i == len(self.chunks) and not self.done:
+                        self.cond.wait()
+                    new = self.chunks[i:]
+                    done, error = self.done, self.error
+                i += len(new)
+                yield from new
+                if done and i == len(self.chunks):
+                    if error is not None:
+                        raise error
+                    return
+        finally:
+            with self.cond:
+                self.readers -= 1
+                self.abandoned = self.readers == 0 and not self.done
+
+class Coalescer:
+    """
+    Runs identical requests that are in flight at the same time as one
+    backend call. The first request starts the call; the others attach to
+    it and get the same reply, or replay the stream so far and then follow
+    it live. A streamed call runs on its own thread, so a caller that stops
+    reading early doesn't cut the others off; it is stopped once nobody is
+    reading. Finished calls are forgotten: repeats after that are the
+    response cache's job. Each backend call runs inside the `admission`
+    context, if one is set.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.shared = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                with flight.cond:
+                    joined = not flight.abandoned
+                    flight.readers += joined
+            if flight is not None and joined:
+                self.shared += 1
+                tracing.metrics.inc("yashbot_coalesced_total", backend=self.name, kind=key[0])
+                return flight, False
+            self.calls += 1
+            flight = self._flights[key] = _Flight()
+            return flight, True
+
+    def _end(self, key, flight, error=None):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.finish(error)
+
+    def chat(self, key, call):
+        """call() once for all concurrent requests with this key."""
+        key = ("chat", key)
+        flight, leader = self._join(key)
+        if leader:
+            try:
+                with _admitted():
+                    reply = call()
+            except Exception as e:
+                self._end(key, flight, e)
+                raise
+            flight.add(reply)
+            self._end(key, flight)
+            return reply
+        with tracing.span("coalesced"):
+            return "".join(flight.read())
+
+    def stream(self, key, call):
+        """The chunks of call() (a generator), produced once for all concurrent readers."""
+        key = ("stream", key)
+        flight, leader = self._join(key)
+        if leader:
+            # Runs in a copy of this context, so the leader's trace gets its spans
+            context = contextvars.copy_context()
+            threading.Thread(target=context.run, args=(self._produce, key, flight, call),
+                             name=f"yashbot-coalesce-{self.name}", daemon=True).start()
+            yield from flight.read()
+            return
+        with tracing.span("coalesced"):
+            yield from flight.read()
+
+    def _produce(self, key, flight, call):
+        try:
+            with _admitted():
+                chunks = call()
+                try:
+                    for chunk in chunks:
+                        if not flight.add(chunk):
+                            break
+                finally:
+                    chunks.close()
+        except Exception as e:
+            self._end(key, flight, e)
+            return
+        self._end(key, flight)
+
+    def stats(self):
+        with self._lock:
+            return {"calls": self.calls, "shared": self.shared, "in_flight": len(self._flights)}
+
+def request_key(prompt, params, kwargs):
+    """The response cache's key for the request plus any other arguments (e.g. an OpenRouter model)."""
+    model, temperature, system_prompt = params(**kwargs)
+    return make_key(prompt, model, temperature, system_prompt) + json.dumps(kwargs, sort_keys=True, default=str)
+
+def coalesced_chat(chat, coalescer, params):
+    """
+    Wrap a chat function so concurrent identical one-shot requests
+    (remember=False) share a call. Remembered turns belong to a
+    conversation and always run.
+    """
+    def wrapper(prompt, **kwargs):
+        if kwargs.get("remember", True):
+            return chat(prompt, **kwargs)
+        return coalescer.chat(request_key(prompt, params, kwargs), lambda: chat(prompt, **kwargs))
+    wrapper.__name__ = chat.__name__
+    return wrapper
+
+def coalesced_stream(chat_stream, coalescer, params):
+    """Streaming counterpart of coalesced_chat."""
+    def wrapper(prompt, **kwargs):
+        if kwargs.get("remember", True):
+            return chat_stream(prompt, **kwargs)
+        return coalescer.stream(request_key(prompt, params, kwargs), lambda: chat_stream(prompt, **kwargs))
+    wrapper.__name__ = chat_stream.__name__
+    return wrapper
+
+_coalescers = {}
+_coalescers_lock = threading.Lock()
+
+def get_coalescer(name):
+    """The shared coalescer for a backend."""
+    with _coalescers_lock:
+        if name not in _coalescers:
+            _coalescers[name] = Coalescer(name)
+        return _coalescers[name]
+
+def coalescing_enabled():
+    return os.getenv("YASHBOT_COALESCE", "1") != "0"
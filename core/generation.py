@@ -0,0 +1,104 @@
+# core/generation.py
+
+import json
+from dataclasses import dataclass
+
+@dataclass
+class GenerationResult:
+    text: str
+    generated_tokens: int = 0
+    kept_tokens: int = 0
+    stop_reason: str = "end"    # "stop", "length" or "end"
+
+def generation_key(system_prompt, max_tokens=None, stop=None):
+    """The system prompt part of a cache key, marked with any max_tokens / stop a caller overrides."""
+    if max_tokens is not None:
+        system_prompt = f"{system_prompt}\n#max_tokens:{max_tokens}"
+    if stop is not None:
+        system_prompt = f"{system_prompt}\n#stop:{json.dumps(list(stop))}"
+    return system_prompt
+
+class StopFilter:
+    """
+    Cuts a token stream at the first stop string or after max_tokens tokens.
+
+    Text that could be the start of a stop string is held back until the
+    next chunk shows whether it is, so stop strings split across tokens are
+    still caught and never leak into the output. Each chunk fed in counts as
+    one generated token.
+    """
+
+    def __init__(self, stop=(), max_tokens=None, strip_leading=False):
+        self.stop = [s for s in (stop or ()) if s]
+        self.max_tokens = max_tokens
+        self.strip_leading = strip_leading
+        self.generated_tokens = 0
+        self.stop_reason = None
+        self._hold = max((len(s) for s in self.stop), default=1) - 1
+        self._buffer = ""
+        self._emitted = 0       # characters of the full text already emitted
+        self._seen = 0          # characters of the full text fed so far
+        self._token_ends = []   # end offset of every token in the full text
+
+    def feed(self, chunk):
+        """Add one token; return the text that is now safe to emit."""
+        self.generated_tokens += 1
+        if self.strip_leading and not self._seen:
+            chunk = chunk.lstrip()
+        self._buffer += chunk
+        self._seen += len(chunk)
+        self._token_ends.append(self._seen)
+
+        hits = [i for i in (self._buffer.find(s) for s in self.stop) if i != -1]
+        if hits:
+            self.stop_reason = "stop"
+            return self._emit(min(hits), drop_rest=True)
+        if self.max_tokens and self.generated_tokens >= self.max_tokens:
+            self.stop_reason = "length"
+            return self._emit(len(self._buffer))
+        return self._emit(self._safe_length())
+
+    def _safe_length(self):
+        # Everything before the earliest tail that could still grow into a stop string
+        for i in range(max(0, len(self._buffer) - self._hold), len(self._buffer)):
+            tail = self._buffer[i:]
+            if any(s.startswith(tail) for s in self.stop):
+                return i
+        return len(self._buffer)
+
+    def _emit(self, n, drop_rest=False):
+        out, self._buffer = self._buffer[:n], ("" if drop_rest else self._buffer[n:])
+        self._emitted += len(out)
+        return out
+
+    def flush(self):
+        return self._emit(len(self._buffer))
+
+    @property
+    def kept_tokens(self):
+        # Tokens that contributed at least one character to the output
+        return sum(1 for i, end in enumerate(self._token_ends)
+                   if (self._token_ends[i - 1] if i else 0) < self._emitted or end <= self._emitted)
+
+    def apply(self, chunks):
+        """
+        Filter an iterable of chunks, yielding the kept text. Stops reading
+        (and closes the source, which cancels generation) at the first stop.
+        """
+        try:
+            for chunk in chunks:
+                out = self.feed(chunk)
+                if out:
+                    yield out
+                if self.stop_reason:
+                    return
+            self.stop_reason = "end"
+            rest = self.flush()
+            if rest:
+                yield rest
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+
+    def result(self, text):
+        return GenerationResult(text, self.generated_tokens, self.kept_tokens, self.stop_reason or "end")
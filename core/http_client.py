@@ -0,0 +1,164 @@
+# core/http_client.py
+
+import random
+import socket
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NameResolutionError, NewConnectionError
+
+RETRY_STATUSES = {500, 502, 503, 504}
+# Methods that are safe to send twice; others are only retried if the
+# first attempt never reached the server
+IDEMPOTENT = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+# Timing dict of the request currently being sent on this thread; the
+# connection classes below fill in DNS/connect times when they open a socket.
+_current = threading.local()
+
+class _TimedConnectionMixin:
+    def connect(self):
+        timing = getattr(_current, "timing", None)
+        if timing is None:
+            return super().connect()
+
+        start = time.perf_counter()
+        super().connect()
+        # TCP (and TLS) setup, without the lookup _new_conn timed
+        timing["connect"] = time.perf_counter() - start - (timing["dns"] or 0.0)
+        timing["reused"] = False
+
+    def _new_conn(self):
+        timing = getattr(_current, "timing", None)
+        if timing is None:
+            return super()._new_conn()
+
+        host = self._dns_host
+        start = time.perf_counter()
+        try:
+            addresses = socket.getaddrinfo(host, self.port, 0, socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            raise NameResolutionError(self.host, self, e) from e
+        timing["dns"] = time.perf_counter() - start
+
+        # Connect to the addresses just resolved (in order, like urllib3)
+        # instead of letting urllib3 look the name up a second time
+        error = None
+        for *_, sockaddr in addresses:
+            self._dns_host = sockaddr[0]
+            try:
+                return super()._new_conn()
+            except (NewConnectionError, ConnectTimeoutError) as e:
+                error = e
+            finally:
+                self._dns_host = host
+        raise error
+
+class TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+class TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+class TimedHTTPAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http":  _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+def _not_sent(error):
+    """Whether a failed request never reached the server (so retrying can't duplicate it)."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+class HttpClient:
+    """
+    Shared HTTP client: a pooled keep-alive requests.Session with connect and
+    read timeouts and jittered exponential backoff on 5xx / connection errors.
+    POSTs (completions are billed) are only retried after connection errors
+    when the request can't have been sent.
+
+    Every response gets a ``timing`` dict (dns, connect, ttfb, total in
+    seconds, plus attempts); dns/connect are None when a pooled connection
+    was reused. For streamed responses ``total`` is filled in by finish().
+    """
+
+    def __init__(self, connect_timeout=5.0, read_timeout=60.0, retries=3,
+                 backoff=0.5, max_backoff=8.0, pool_size=10):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.session = requests.Session()
+        adapter = TimedHTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._local = threading.local()
+
+    @property
+    def last_timing(self):
+        """Timing of the most recent request made on this thread."""
+        return getattr(self._local, "timing", None)
+
+    def backoff_delay(self, attempt):
+        # "Full jitter": uniform between 0 and the capped exponential delay
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", (self.connect_timeout, self.read_timeout))
+        timing = {"dns": None, "connect": None, "ttfb": None, "total": None,
+                  "attempts": 0, "reused": True}
+        self._local.timing = timing
+        start = time.perf_counter()
+
+        for attempt in range(self.retries + 1):
+            timing["attempts"] = attempt + 1
+            last_try = attempt == self.retries
+            _current.timing = timing
+            attempt_start = time.perf_counter()
+            try:
+                r = self.session.request(method, url, **kwargs)
+            except requests.ConnectionError as e:
+                if last_try or (method.upper() not in IDEMPOTENT and not _not_sent(e)):
+                    raise
+            else:
+                if r.status_code not in RETRY_STATUSES or last_try:
+                    break
+                r.close()
+            finally:
+                _current.timing = None
+            time.sleep(self.backoff_delay(attempt))
+
+        # r.elapsed runs from sending the request until the headers were parsed
+        timing["ttfb"] = attempt_start - start + r.elapsed.total_seconds()
+        if not kwargs.get("stream"):
+            timing["total"] = time.perf_counter() - start
+        r.timing = timing
+        r._timing_start = start
+        return r
+
+    @staticmethod
+    def finish(response):
+        """Record the total time of a streamed response once it is consumed."""
+        timing = response.timing
+        timing["total"] = time.perf_counter() - response._timing_start
+        return timing
@@ -0,0 +1,249 @@
+# core/intents.py
+
+import datetime
+import os
+import re
+import threading
+
+# Word order may differ, but every word counts: a set-based score would
+# call "tell me a joke about time" a perfect match for "tell me the time"
+try:
+    from fuzzywuzzy import fuzz
+    def _similarity(a, b):
+        return fuzz.token_sort_ratio(a, b) / 100
+except ImportError:  # fuzzywuzzy is optional; difflib is close enough here
+    from difflib import SequenceMatcher
+    def _similarity(a, b):
+        return SequenceMatcher(None, a, b).ratio()
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+_WORD = re.compile(r"[a-z0-9']+")
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "it", "what", "what's", "whats", "how", "much",
+    "my", "me", "of", "on", "in", "tell", "show", "please", "can", "you", "i", "do",
+    "does", "right", "now", "current", "currently", "there", "this", "to", "be",
+}
+
+# Politeness around a query ("hey, can you tell me ... please?") that
+# patterns don't have to spell out
+_PREFIX = r"(?:(?:hey|hi|ok|okay|yashbot),? )*(?:please |(?:can|could) you )?(?:tell me |show me |check |give me )?"
+_SUFFIX = r"(?: (?:please|now|right now))?"
+
+class Intent:
+    """
+    A query YashBot can answer without a model. `patterns` are regexes for
+    the whole query (give or take politeness and trailing punctuation) and
+    match with full confidence; `examples` are phrasings used for fuzzy
+    matching when no pattern hits.
+    """
+
+    def __init__(self, name, handler, patterns=(), examples=()):
+        self.name = name
+        self.handler = handler
+        self.patterns = list(patterns)
+        self.examples = [e.lower() for e in examples]
+
+class IntentEngine:
+    """
+    Answers utility queries locally. All patterns are compiled into one
+    regex (one named group per intent), and example phrasings are indexed
+    by content word. A query is only fuzzy-scored against intents whose
+    examples use every one of its content words (give or take a typo), so
+    "explain memory usage" or "tell me about time travel" go to the model.
+    Long queries are never fuzzy-matched either, nor is a query at least as
+    close to one of the `negatives` (questions that only sound like utility
+    queries) as to the intent's examples.
+    """
+
+    def __init__(self, threshold=0.85, max_fuzzy_words=6, negatives=()):
+        self.threshold = threshold
+        self.max_fuzzy_words = max_fuzzy_words
+        self.negatives = [n.lower() for n in negatives]
+        self.intents = {}
+        self.served = 0
+        self.deferred = 0
+        self._lock = threading.Lock()
+        self._compile()
+
+    def register(self, intent):
+        self.intents[intent.name] = intent
+        self._compile()
+        return intent
+
+    def _compile(self):
+        groups = [
+            f"(?P<{name}>{'|'.join(f'(?:{p})' for p in intent.patterns)})"
+            for name, intent in self.intents.items() if intent.patterns
+        ]
+        self._regex = re.compile(f"{_PREFIX}(?:{'|'.join(groups) or r'(?!x)x'}){_SUFFIX}", re.IGNORECASE)
+        self._index = {}
+        self._vocab = {}
+        for name, intent in self.intents.items():
+            for example in intent.examples:
+                for word in _content_words(example):
+                    self._index.setdefault(word, set()).add(name)
+                    self._vocab.setdefault(name, set()).add(word)
+
+    def _covers(self, name, words):
+        # Every content word is one the intent's examples use, or a typo of one
+        vocab = self._vocab.get(name, ())
+        return all(w in vocab or any(_similarity(w, v) >= 0.8 for v in vocab) for w in words)
+
+    def match(self, text):
+        """Return (intent, confidence) for the best local match, or (None, 0.0)."""
+        text = " ".join(text.lower().split()).rstrip(" ?!.")
+        m = self._regex.fullmatch(text)
+        if m:
+            return self.intents[m.lastgroup], 1.0
+
+        words = _content_words(text)
+        if not words or len(_WORD.findall(text)) > self.max_fuzzy_words:
+            return None, 0.0
+        candidates = {name for name in set().union(*(self._index.get(w, ()) for w in words))
+                      if self._covers(name, words)}
+        best, best_score = None, 0.0
+        for name in candidates:
+            score = max(_similarity(text, example) for example in self.intents[name].examples)
+            if score > best_score:
+                best, best_score = self.intents[name], score
+        if best is not None and any(_similarity(text, n) >= best_score for n in self.negatives):
+            return None, 0.0
+        return best, best_score
+
+    def answer(self, text):
+        """The local answer if confident enough, else None (ask the model)."""
+        intent, confidence = self.match(text)
+        if intent is None or confidence < self.threshold:
+            with self._lock:
+                self.deferred += 1
+            return None
+        try:
+            response = intent.handler(text)
+        except Exception as e:
+            response = f"⚠ Error in {intent.name}: {e}"
+        with self._lock:
+            self.served += 1
+        return response
+
+    def stats(self):
+        total = self.served + self.deferred
+        return {
+            "served_locally": self.served,
+            "deferred_to_model": self.deferred,
+            "local_share": self.served / total if total else 0.0,
+        }
+
+def _content_words(text):
+    return {w for w in _WORD.findall(text.lower()) if w not in STOPWORDS}
+
+def _gib(n):
+    return f"{n / 2**30:.1f} GB"
+
+# ——— Built-in intents ———
+
+def current_time(_):
+    return datetime.datetime.now().strftime("It's %H:%M:%S.")
+
+def current_date(_):
+    return datetime.datetime.now().strftime("Today is %A, %B %d, %Y.")
+
+def current_datetime(_):
+    return datetime.datetime.now().strftime("%A, %B %d, %Y at %H:%M:%S")
+
+_cpu_sampled = False
+
+def _require_psutil():
+    if psutil is None:
+        raise RuntimeError("psutil is not installed")
+
+def cpu_usage(_):
+    _require_psutil()
+    # interval=None compares with the previous call instead of sleeping;
+    # only the very first reading needs a short sample to be meaningful
+    global _cpu_sampled
+    percent = psutil.cpu_percent(interval=None if _cpu_sampled else 0.1)
+    _cpu_sampled = True
+    return f"CPU usage is {percent:.0f}% across {psutil.cpu_count()} cores."
+
+def memory_usage(_):
+    _require_psutil()
+    mem = psutil.virtual_memory()
+    return f"Memory: {_gib(mem.used)} used of {_gib(mem.total)} ({mem.percent:.0f}%), {_gib(mem.available)} available."
+
+def disk_usage(_):
+    _require_psutil()
+    disk = psutil.disk_usage("/")
+    return f"Disk: {_gib(disk.used)} used of {_gib(disk.total)} ({disk.percent:.0f}%), {_gib(disk.free)} free."
+
+def system_info(text):
+    return " ".join(handler(text) for handler in (cpu_usage, memory_usage, disk_usage))
+
+# "what's my/the cpu usage" asks for a reading; "what is cpu usage" asks what it is
+_WHAT = r"(?:what(?:'s| is) (?:my|the) |(?:my |the )?)"
+
+BUILTIN_INTENTS = [
+    Intent("datetime", current_datetime,
+           patterns=[_WHAT + r"(?:current )?(?:date and time|time and date)"],
+           examples=["date and time", "what is the date and time now"]),
+    Intent("time", current_time,
+           patterns=[r"what time is it", _WHAT + r"(?:current )?time", r"time now"],
+           examples=["what time is it", "tell me the time", "time now", "current time"]),
+    Intent("date", current_date,
+           patterns=[r"what(?:'s| is) (?:the |today'?s )?date(?: today)?", r"(?:the )?(?:today'?s )?date(?: today)?",
+                     r"what day is (?:it|today)(?: today)?", r"today"],
+           examples=["what is the date", "what day is it today", "today's date", "date today"]),
+    Intent("cpu", cpu_usage,
+           patterns=[_WHAT + r"(?:cpu|processor) (?:usage|load|utili[sz]ation)",
+                     r"how busy is (?:my|the) (?:cpu|processor)"],
+           examples=["cpu usage", "how busy is my cpu", "processor load"]),
+    Intent("memory", memory_usage,
+           patterns=[_WHAT + r"(?:ram|memory) (?:usage|used|free|left|available)",
+                     r"how much (?:ram|memory)(?: is| do i have)?(?: free| left| available| used| in use)?",
+                     r"(?:free|available) (?:ram|memory)"],
+           examples=["memory usage", "how much ram is free", "ram usage"]),
+    Intent("disk", disk_usage,
+           patterns=[_WHAT + r"(?:disk|storage) (?:space|usage|left|free)",
+                     r"how much (?:disk|storage)(?: space)?(?: is| do i have)?(?: free| left| available| used)?",
+                     r"free (?:disk|storage) space"],
+           examples=["disk space", "how much storage is left", "disk usage"]),
+    Intent("system", system_info,
+           patterns=[_WHAT + r"system (?:info|information|status|stats)"],
+           examples=["system info", "system status"]),
+]
+
+# Questions for the model that mention the same words; none may be answered locally
+NEGATIVE_EXAMPLES = [
+    "what is the time complexity of quicksort",
+    "how much memory does a python list use",
+    "date of the french revolution",
+    "free memory in c",
+    "memory usage in my java app is high, why",
+    "what time is it in new york",
+    "what is the date of easter",
+    "disk usage of a docker image",
+    "cpu usage of my python script",
+    "time zones explained",
+    "how much ram do i need for gaming",
+]
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    """Shared engine with the built-in intents; YASHBOT_INTENT_THRESHOLD sets the confidence cut-off."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = IntentEngine(threshold=float(os.getenv("YASHBOT_INTENT_THRESHOLD", "0.85")),
+                                   negatives=NEGATIVE_EXAMPLES)
+            for intent in BUILTIN_INTENTS:
+                _engine.register(intent)
+        return _engine
+
+def answer_locally(text):
+    """Answer `text` without a model if it is a known utility query, else None."""
+    return get_engine().answer(text)
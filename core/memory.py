@@ -0,0 +1,181 @@
+# core/memory.py
+
+import hashlib
+import os
+import re
+import threading
+from collections import deque
+
+from models.llm_interface import estimate_tokens
+
+class Turn:
+    """One message; its token count is computed once, when it is added."""
+
+    __slots__ = ("role", "text", "tokens")
+
+    def __init__(self, role, text, tokens):
+        self.role = role
+        self.text = text
+        self.tokens = tokens
+
+_SENTENCE = re.compile(r"(?<=[.!?])\s")
+
+def extractive_summary(summary, turns, budget, count_tokens=estimate_tokens):
+    """
+    Fold `turns` into `summary` without a model: one line per turn (its
+    first sentence, shortened), dropping the oldest lines once the summary
+    is over budget. Only the new turns are looked at.
+    """
+    lines = summary.splitlines() if summary else []
+    for turn in turns:
+        first = _SENTENCE.split(turn.text.strip(), 1)[0]
+        if len(first) > 160:
+            first = first[:157].rstrip() + "..."
+        lines.append(f"{turn.role.capitalize()}: {first}")
+    while len(lines) > 1 and count_tokens("\n".join(lines)) > budget:
+        lines.pop(0)
+    return "\n".join(lines)
+
+def model_summarizer(ask):
+    """
+    A summarize function that asks a model (`ask(prompt) -> str`, stateless)
+    to update the running summary with just the newly folded turns. Falls
+    back to extractive_summary if the model returns an error.
+    """
+    def summarize(summary, turns, budget, count_tokens=estimate_tokens):
+        new = "\n".join(f"{t.role.capitalize()}: {t.text}" for t in turns)
+        words = max(20, budget * 3 // 4)
+        reply = ask(
+            f"Summary of the conversation so far:\n{summary or '(empty)'}\n\n"
+            f"New messages:\n{new}\n\n"
+            f"Rewrite the summary to include the new messages, in at most {words} words. "
+            f"Reply with the summary only."
+        )
+        if not reply or reply.startswith("⚠"):
+            return extractive_summary(summary, turns, budget, count_tokens)
+        return reply.strip()
+    return summarize
+
+class ConversationMemory:
+    """
+    Recent turns kept verbatim within `budget` tokens; older turns are
+    folded into a rolling summary of at most `summary_budget` tokens.
+
+    Each turn's token count is cached when it is added and the running
+    total is kept up to date, so adding a turn and building a prompt never
+    re-count old messages. Folding only hands the turns being dropped to
+    the summarizer along with the previous summary. It folds down to
+    3/4 of the budget, so the summarizer runs every few turns rather than
+    on every one.
+    """
+
+    def __init__(self, budget=1500, summary_budget=300, summarize=extractive_summary,
+                 count_tokens=estimate_tokens):
+        self.budget = budget
+        self.summary_budget = summary_budget
+        self.summarize = summarize
+        self.count_tokens = count_tokens
+        self.turns = deque()
+        self.summary = ""
+        self.summary_tokens = 0
+        self.recent_tokens = 0
+        self.folds = 0
+        self._digest = ""
+        self._lock = threading.RLock()
+
+    def add(self, role, text):
+        with self._lock:
+            turn = Turn(role, text, self.count_tokens(text))
+            self.turns.append(turn)
+            self.recent_tokens += turn.tokens
+            # Chained hash of everything said so far: identifies the conversation state
+            self._digest = hashlib.sha256(f"{self._digest}\0{role}\0{text}".encode("utf-8")).hexdigest()
+            if self.recent_tokens > self.budget:
+                self._fold()
+
+    def _fold(self):
+        target = self.budget * 3 // 4
+        folded = []
+        # Always keep the latest turn verbatim, even if it alone is over budget
+        while self.recent_tokens > target and len(self.turns) > 1:
+            turn = self.turns.popleft()
+            self.recent_tokens -= turn.tokens
+            folded.append(turn)
+        if folded:
+            self.summary = self.summarize(self.summary, folded, self.summary_budget, self.count_tokens)
+            self.summary_tokens = self.count_tokens(self.summary)
+            self.folds += 1
+
+    @property
+    def digest(self):
+        return self._digest
+
+    @property
+    def tokens(self):
+        """Tokens the remembered context adds to a prompt."""
+        return self.recent_tokens + self.summary_tokens
+
+    def __len__(self):
+        return len(self.turns)
+
+    def messages(self):
+        """The context as chat-completion messages (summary first, as a system message)."""
+        with self._lock:
+            messages = []
+            if self.summary:
+                messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{self.summary}"})
+            messages.extend({"role": t.role, "content": t.text} for t in self.turns)
+            return messages
+
+    def transcript(self):
+        """The context as plain text, for models that take a single system prompt."""
+        with self._lock:
+            parts = []
+            if self.summary:
+                parts.append(f"Summary of the earlier conversation:\n{self.summary}")
+            if self.turns:
+                parts.append("Recent conversation:\n" + "\n".join(
+                    f"{'User' if t.role == 'user' else 'Assistant'}: {t.text}" for t in self.turns))
+            return "\n\n".join(parts)
+
+    def clear(self):
+        with self._lock:
+            self.turns.clear()
+            self.summary = ""
+            self.summary_tokens = self.recent_tokens = 0
+            self._digest = ""
+
+    def stats(self):
+        return {
+            "turns": len(self.turns),
+            "recent_tokens": self.recent_tokens,
+            "summary_tokens": self.summary_tokens,
+            "budget": self.budget,
+            "folds": self.folds,
+        }
+
+# Default token budgets for the remembered context, per backend. The
+# offline one has to fit the local model's 2048-token window alongside
+# the system prompt and a 500-token reply.
+DEFAULT_BUDGETS = {"online": 1500, "offline": 900}
+
+_memories = {}
+_memories_lock = threading.Lock()
+
+def get_memory(backend, ask=None):
+    """
+    The conversation memory for a backend, created on first use with its
+    budget from YASHBOT_MEMORY_TOKENS_<BACKEND>. With
+    YASHBOT_MEMORY_SUMMARIZER=model, older turns are summarized by `ask`
+    (a stateless chat function) instead of extractively.
+    """
+    with _memories_lock:
+        if backend not in _memories:
+            budget = int(os.getenv(f"YASHBOT_MEMORY_TOKENS_{backend.upper()}",
+                                   str(DEFAULT_BUDGETS.get(backend, 1500))))
+            summarize = extractive_summary
+            if ask is not None and os.getenv("YASHBOT_MEMORY_SUMMARIZER", "extractive") == "model":
+                summarize = model_summarizer(ask)
+            _memories[backend] = ConversationMemory(budget, summary_budget=max(50, budget // 5),
+                                                    summarize=summarize)
+        return _memories[backend]
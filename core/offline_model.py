@@ -1,27 +1,194 @@
 # core/offline_model.py
 
 import datetime
-from models.llm_interface import ask_bot
+import os
+from core import tracing
+from core.generation import GenerationResult, StopFilter, generation_key
+from core.memory import get_memory
+from models.llm_interface import (
+    ask_once, estimate_tokens, get_model, get_pool, get_session, is_loaded, reset_session, stream_once, use_model,
+)
+from models import llm_interface
+from models.model_manager import get_manager
 
-def offline_chat(prompt: str) -> str:
+TEMPERATURE = 0.7
+MAX_TOKENS = 500
+# Answers are one line; anything after is the model continuing the chat
+STOP = ("\n", "User:", "System:")
+
+SYSTEM_MSG = (
+    "You are a concise assistant. Answer only the user's single question "
+    "in one sentence and do not continue the conversation."
+)
+
+def system_prompt():
+    # The date lives in the system prompt so it is evaluated once per day,
+    # not re-sent with every message.
+    today = datetime.datetime.now().strftime("%Y-%m-%d")
+    return f"{SYSTEM_MSG} Today is {today}."
+
+def warm_up():
+    """Start loading the local model in the background (the backend's "warm" hook)."""
+    return llm_interface.warm_up()
+
+def _retrieval():
+    # core.retrieval pulls in numpy, so it is only imported once YASHBOT_DOCS_DIR is set
+    if not os.getenv("YASHBOT_DOCS_DIR"):
+        return None
+    from core import retrieval
+    return retrieval
+
+def memory():
+    """The offline conversation memory (summarizing with a one-shot local call if enabled)."""
+    return get_memory("offline", ask=lambda prompt: ask_once(prompt, max_tokens=200, temp=TEMPERATURE))
+
+# The system prompt the shared session was last rebuilt with, and the
+# (base prompt, memory digest) its KV cache is currently in step with
+_session_prompt = None
+_synced = None
+
+def _session(prompt, max_tokens):
+    """
+    The shared chat session. While it holds every remembered turn, only the
+    new prompt has to be evaluated. It is rebuilt from the conversation
+    memory (summary plus recent turns, in the system prompt) when it is
+    missing turns (first use, a cache hit, the model having been borrowed
+    for a one-shot answer) or the next turn would overflow the context.
+    """
+    global _session_prompt
+    conversation = memory()
+    base = system_prompt()
+    session = get_session(_session_prompt or base)
+    in_step = session.is_open and _synced == (base, conversation.digest)
+    if not in_step or not session.fits(prompt, max_tokens):
+        context = conversation.transcript()
+        _session_prompt = f"{base}\n\n{context}" if context else base
+        session = get_session(_session_prompt)
+        session.reset()
+    return session
+
+def remember_turn(prompt, reply, remember=True, **_options):
+    """
+    Record an exchange in the conversation memory (also used for cache
+    hits, which pass the request's generation options along).
+    """
+    if remember and reply and not reply.startswith("⚠"):
+        conversation = memory()
+        conversation.add("user", prompt)
+        conversation.add("assistant", reply)
+
+def _record(prompt, reply):
+    # The session generated this reply, so its context now includes the turn
+    global _synced
+    in_step = _synced == (system_prompt(), memory().digest)
+    remember_turn(prompt, reply)
+    if in_step:
+        _synced = (system_prompt(), memory().digest)
+
+def _use_routed_model(prompt):
+    # With short/long routing, swap to the model for this question. Models
+    # stay loaded while they fit the RAM budget, so a swap usually only
+    # costs rebuilding the session from memory.
+    manager = get_manager()
+    name = manager.route(prompt)
+    if name is None or (name == manager.active and is_loaded()):
+        return
+    with tracing.span("model_load" if not manager.is_loaded(name) else "model_switch", model=name):
+        use_model(name)
+
+def _grounded(prompt):
+    # The top doc chunks go in front of this turn's question only (capped by
+    # YASHBOT_RETRIEVAL_TOKENS), so the system prompt and session stay put
+    retrieval = _retrieval()
+    if retrieval is None:
+        return prompt
+    with tracing.span("retrieval") as span:
+        context = retrieval.grounding(prompt)
+        span.set(context_tokens=estimate_tokens(context))
+    if not context:
+        return prompt
+    return f"Context from the docs:\n{context}\n\nUsing the context if relevant, answer: {prompt}"
+
+def _token_stream(prompt, remember, max_tokens, stop, temperature):
+    global _synced
+    if remember or get_pool() is None:
+        # The worker pool serves one model; routing applies in-process only
+        _use_routed_model(prompt)
+    prompt = _grounded(prompt)
+    if not is_loaded() and (remember or get_pool() is None):
+        # Usually already loaded (or loading) by warm_up(); this waits for it
+        with tracing.span("model_load"):
+            get_model()
+    if remember:
+        with tracing.span("prompt_build") as span:
+            session = _session(prompt, max_tokens)
+            _synced = (system_prompt(), memory().digest)
+            span.set(context_tokens=memory().tokens)
+        return tracing.timed_stream(session.ask_stream(prompt, max_tokens=max_tokens, temp=temperature))
+    return tracing.timed_stream(
+        stream_once(prompt, system_prompt(), max_tokens=max_tokens, stop=stop, temp=temperature))
+
+def offline_generate(prompt: str, remember: bool = True, stop=STOP, max_tokens: int = MAX_TOKENS,
+                     temperature: float = TEMPERATURE) -> GenerationResult:
     """
     Ground the model on today’s date, give it a clear system instruction
-    to answer *only* the user’s question, and return just the first line.
+    to answer *only* the user’s question, and stop generating at the first
+    stop string (by default the end of the first line). The result reports
+    how many tokens were generated and how many were kept.
+
+    The chat session is kept alive between calls so earlier turns don't
+    have to be re-evaluated; remember=False answers in a throwaway session
+    (or on the model worker pool, if enabled) for independent prompts such
+    as batch jobs.
     """
-    # 1) Fetch real date
-    today = datetime.datetime.now().strftime("%Y-%m-%d")
+    stop_filter = StopFilter(stop, max_tokens, strip_leading=True)
+    text = "".join(stop_filter.apply(_token_stream(prompt, remember, max_tokens, stop, temperature))).strip()
+    if remember:
+        _record(prompt, text)
+    return stop_filter.result(text)
+
+def _options(temperature, max_tokens, stop):
+    # None means the backend default (as the server passes them through)
+    return (TEMPERATURE if temperature is None else temperature,
+            MAX_TOKENS if max_tokens is None else max_tokens,
+            STOP if stop is None else tuple(stop))
 
-    # 2) Build a mini chat prompt
-    system_msg = (
-        "You are a concise assistant. Answer only the user's single question "
-        "in one sentence and do not continue the conversation."
-    )
-    user_msg   = f"Today is {today}. {prompt}"
-    full_prompt = f"System: {system_msg}\nUser: {user_msg}\nAssistant:"
+def offline_chat(prompt: str, remember: bool = True, temperature=None, max_tokens=None, stop=None) -> str:
+    """offline_generate(), returning just the answer text."""
+    temperature, max_tokens, stop = _options(temperature, max_tokens, stop)
+    return offline_generate(prompt, remember, stop, max_tokens, temperature).text
 
-    # 3) Call GPT4All
-    response = ask_bot(full_prompt)
+def offline_chat_stream(prompt: str, remember: bool = True, temperature=None, max_tokens=None, stop=None):
+    """
+    Streaming version of offline_chat: yields text as it is generated and
+    stops the model as soon as a stop string appears.
+    """
+    temperature, max_tokens, stop = _options(temperature, max_tokens, stop)
+    stop_filter = StopFilter(stop, max_tokens, strip_leading=True)
+    chunks = []
+    for chunk in stop_filter.apply(_token_stream(prompt, remember, max_tokens, stop, temperature)):
+        chunks.append(chunk)
+        yield chunk
+    if remember:
+        _record(prompt, "".join(chunks).strip())
 
-    # 4) Return only the first line (to avoid multi-turn chatter)
-    return response.split("\n")[0].strip()
+def cache_params(remember=True, temperature=None, max_tokens=None, stop=None):
+    """
+    What the response cache keys on besides the prompt: includes today's
+    date, any non-default max_tokens / stop and, with remember, the
+    conversation so far.
+    """
+    system = generation_key(system_prompt(), max_tokens, stop)
+    if remember and memory().digest:
+        system = f"{system}\n#conversation:{memory().digest}"
+    retrieval = _retrieval()
+    if retrieval is not None:
+        system = f"{system}\n#docs:{retrieval.get_index().version}"
+    return get_manager().cache_key(), TEMPERATURE if temperature is None else temperature, system
 
+def reset_chat():
+    """Forget the conversation so far."""
+    global _synced
+    memory().clear()
+    _synced = None
+    reset_session()
@@ -1,18 +1,58 @@
 # core/online_model.py
 
-import requests
+import json
 import os
+import threading
+import time
 
-MODEL = "mistralai/mistral-7b-instruct:free"
+from core import tracing
+from core.generation import GenerationResult, StopFilter, generation_key
+from core.http_client import HttpClient
+from core.memory import get_memory
+from core.rate_limit import get_limiter
 
-def online_chat(prompt):
+MODEL = os.getenv("OPENROUTER_MODEL", "mistralai/mistral-7b-instruct:free")
+TEMPERATURE = 0.7
+SYSTEM_PROMPT = "You are YashBot, a helpful assistant."
+# Sent as OpenRouter's `stop` and enforced client-side on streams as well
+STOP = ("\nUser:", "\nSystem:")
+MAX_TOKENS = None   # no budget beyond the model's own limit
+DEFAULT_BASE_URL = "https://openrouter.ai/api/v1"
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Shared keep-alive client, configured from the environment on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient(
+                connect_timeout=float(os.getenv("OPENROUTER_CONNECT_TIMEOUT", "5")),
+                read_timeout=float(os.getenv("OPENROUTER_READ_TIMEOUT", "60")),
+                retries=int(os.getenv("OPENROUTER_RETRIES", "3")),
+                pool_size=int(os.getenv("OPENROUTER_POOL_SIZE", "16")),
+            )
+        return _client
+
+def chat_url():
+    # OPENROUTER_BASE_URL can point at a local stand-in (see mock_openrouter.py)
+    base = os.getenv("OPENROUTER_BASE_URL", DEFAULT_BASE_URL)
+    return base.rstrip("/") + "/chat/completions"
+
+def _options(temperature, max_tokens, stop):
+    # None means the backend default (as the server passes them through)
+    return (TEMPERATURE if temperature is None else temperature,
+            MAX_TOKENS if max_tokens is None else max_tokens,
+            STOP if stop is None else tuple(stop))
+
+def _request(prompt, stream=False, model=None, history=(), temperature=TEMPERATURE,
+             max_tokens=MAX_TOKENS, stop=STOP):
     # Get API key from environment variable (called after load_dotenv())
-    API_KEY = os.getenv("OPENROUTER_API_KEY")
-    
+    API_KEY = os.getenv("OPENROUTER_API_KEY") or os.getenv("OPENROUTER_API_KEYS", "").split(",")[0].strip()
     if not API_KEY:
-        return "⚠ Error: OPENROUTER_API_KEY environment variable not set. Please add your API key to .env file."
-    
-    url = "https://openrouter.ai/api/v1/chat/completions"
+        return None, None
+
     headers = {
         "Authorization": f"Bearer {API_KEY}",
         "Content-Type":  "application/json",
@@ -20,19 +60,162 @@ def online_chat(prompt):
         "X-Title":       "YashBot CLI"
     }
     data = {
-        "model":       MODEL,
+        "model":       model or MODEL,
         "messages": [
-            {"role": "system", "content": "You are YashBot, a helpful assistant."},
+            {"role": "system", "content": SYSTEM_PROMPT},
+            *history,
             {"role": "user",   "content": prompt}
         ],
-        "temperature": 0.7
+        "temperature": temperature
     }
+    if stop:
+        data["stop"] = list(stop)
+    if max_tokens:
+        data["max_tokens"] = max_tokens
+    if stream:
+        data["stream"] = True
+    return headers, data
+
+def _post(headers, data, stream=False):
+    """
+    Send a chat request when the rate limiter allows it, on whichever key
+    (and model, if fallbacks are set) is free. A 429 is reported to the
+    limiter and the request waits for its next turn, up to
+    OPENROUTER_RATE_RETRIES times. r.timing["rate_wait"] is the time spent
+    waiting for a turn.
+    """
+    limiter = get_limiter()
+    waited = 0.0
+    for attempt in range(limiter.retries + 1):
+        start = time.perf_counter()
+        lane = limiter.acquire(data["model"])
+        waited += time.perf_counter() - start
+        key, model = lane
+        r = get_client().post(chat_url(), headers={**headers, "Authorization": f"Bearer {key}"},
+                              json={**data, "model": model}, stream=stream)
+        limiter.report(lane, r)
+        if r.status_code != 429 or attempt == limiter.retries:
+            break
+        r.close()
+    r.timing["rate_wait"] = waited
+    return r
+
+def memory():
+    """The online conversation memory (summarizing with a stateless online call if enabled)."""
+    return get_memory("online", ask=lambda prompt: online_generate(prompt, remember=False).text)
+
+def _history(remember):
+    return memory().messages() if remember else []
+
+def remember_turn(prompt, reply, model=None, remember=True, **_options):
+    """
+    Record an exchange in the conversation memory (also used for cache
+    hits, which pass the request's generation options along).
+    """
+    if remember and reply and not reply.startswith("⚠"):
+        conversation = memory()
+        conversation.add("user", prompt)
+        conversation.add("assistant", reply)
+
+def cache_params(model=None, remember=True, temperature=None, max_tokens=None, stop=None):
+    """What the response cache keys on besides the prompt (and the conversation so far)."""
+    system = generation_key(SYSTEM_PROMPT, max_tokens, stop)
+    if remember and memory().digest:
+        system = f"{system}\n#conversation:{memory().digest}"
+    return model or MODEL, TEMPERATURE if temperature is None else temperature, system
+
+def set_model(name):
+    """Switch the OpenRouter model used when a call doesn't name one."""
+    global MODEL
+    MODEL = name
+
+def reset_chat():
+    """Forget the conversation so far."""
+    memory().clear()
+
+NO_KEY_ERROR = "⚠ Error: OPENROUTER_API_KEY environment variable not set. Please add your API key to .env file."
+
+def online_generate(prompt, model=None, remember=True, temperature=None, max_tokens=None, stop=None):
+    """
+    Ask OpenRouter for a completion. The result carries the reply text and
+    generated/kept token counts (from the API's usage report when present).
+    With remember, recent turns (and a summary of older ones) are sent
+    along and the exchange is added to the conversation memory.
+    """
+    temperature, max_tokens, stop = _options(temperature, max_tokens, stop)
+    with tracing.span("prompt_build"):
+        headers, data = _request(prompt, model=model, history=_history(remember),
+                                 temperature=temperature, max_tokens=max_tokens, stop=stop)
+    if headers is None:
+        return GenerationResult(NO_KEY_ERROR)
 
     try:
-        r = requests.post(url, headers=headers, json=data)
-        r.raise_for_status()
-        j = r.json()
-        return j["choices"][0]["message"]["content"]
+        with tracing.span("generation") as span:
+            r = _post(headers, data)
+            r.raise_for_status()
+            j = r.json()
+            content = j["choices"][0]["message"]["content"]
+            span.set(tokens=j.get("usage", {}).get("completion_tokens", 0), **r.timing)
     except Exception as e:
-        return f"⚠ Error in online response: {e}"
+        return GenerationResult(f"⚠ Error in online response: {e}")
+
+    stop_filter = StopFilter(stop)
+    text = "".join(stop_filter.apply([content]))
+    generated = j.get("usage", {}).get("completion_tokens") or stop_filter.generated_tokens
+    kept = round(generated * len(text) / len(content)) if content else 0
+    reason = "stop" if stop_filter.stop_reason == "stop" else j["choices"][0].get("finish_reason") or "end"
+    remember_turn(prompt, text, remember=remember)
+    return GenerationResult(text, generated, kept, reason)
 
+def online_chat(prompt, model=None, remember=True, temperature=None, max_tokens=None, stop=None):
+    return online_generate(prompt, model, remember, temperature, max_tokens, stop).text
+
+def iter_sse_content(lines):
+    """Yield the content deltas from OpenRouter's server-sent event lines."""
+    for line in lines:
+        # Blank separators and ": OPENROUTER PROCESSING" keep-alive comments
+        if not line or line.startswith(":") or not line.startswith("data:"):
+            continue
+        payload = line[len("data:"):].strip()
+        if payload == "[DONE]":
+            break
+        chunk = json.loads(payload)
+        if "error" in chunk:
+            raise RuntimeError(chunk["error"].get("message", chunk["error"]))
+        delta = chunk["choices"][0].get("delta", {}).get("content")
+        if delta:
+            yield delta
+
+def online_chat_stream(prompt, model=None, remember=True, temperature=None, max_tokens=None, stop=None):
+    """
+    Like online_chat, but yields the reply chunk by chunk as it arrives.
+    The exchange is remembered only if the stream runs to completion.
+    """
+    temperature, max_tokens, stop = _options(temperature, max_tokens, stop)
+    with tracing.span("prompt_build"):
+        headers, data = _request(prompt, stream=True, model=model, history=_history(remember),
+                                 temperature=temperature, max_tokens=max_tokens, stop=stop)
+    if headers is None:
+        yield NO_KEY_ERROR
+        return
+
+    try:
+        client = get_client()
+        with tracing.span("request") as span:
+            r = _post(headers, data, stream=True)
+            span.set(**r.timing)
+        with r:
+            r.raise_for_status()
+            r.encoding = "utf-8"
+            stop_filter = StopFilter(stop, max_tokens)
+            chunks = []
+            # chunk_size=None hands over each event as it arrives instead of
+            # waiting for 512 bytes, which delayed the first token
+            lines = r.iter_lines(chunk_size=None, decode_unicode=True)
+            for chunk in stop_filter.apply(tracing.timed_stream(iter_sse_content(lines))):
+                chunks.append(chunk)
+                yield chunk
+            client.finish(r)
+        remember_turn(prompt, "".join(chunks), remember=remember)
+    except Exception as e:
+        yield f"⚠ Error in online response: {e}"
@@ -0,0 +1,241 @@
+# core/rate_limit.py
+
+import contextlib
+import contextvars
+import email.utils
+import heapq
+import itertools
+import os
+import threading
+import time
+
+# Lower runs first: chat turns go ahead of batch jobs waiting for the same quota
+INTERACTIVE = 0
+BATCH = 10
+
+_priority = contextvars.ContextVar("yashbot_priority", default=INTERACTIVE)
+
+@contextlib.contextmanager
+def priority(level):
+    """Run OpenRouter calls made in this block (and this context) at `level`."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+class RateLimited(RuntimeError):
+    pass
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delay in seconds or an HTTP date), or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def _reset_seconds(value):
+    # x-ratelimit-reset comes as epoch milliseconds (OpenRouter), epoch
+    # seconds, or seconds from now, depending on the provider
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    if value > 1e12:
+        return max(0.0, value / 1000 - time.time())
+    if value > 1e9:
+        return max(0.0, value - time.time())
+    return max(0.0, value)
+
+class TokenBucket:
+    """
+    `rate` requests per second with bursts of up to `burst`; rate 0 means
+    no limit of our own (only what the server's headers say).
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        if self.rate:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        """Seconds until a request may be sent (0 = now)."""
+        self._refill(now)
+        wait = max(0.0, self.blocked_until - now)
+        if self.rate and self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+
+    def take(self, now):
+        self._refill(now)
+        if self.rate:
+            self.tokens -= 1
+
+    def block(self, seconds, now):
+        """Send nothing for `seconds`, and don't burst right after."""
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.tokens = min(self.tokens, 0.0)
+
+    def update(self, headers, now):
+        """Follow the server's x-ratelimit-remaining / x-ratelimit-reset."""
+        remaining = headers.get("x-ratelimit-remaining")
+        if remaining is None:
+            return
+        try:
+            remaining = float(remaining)
+        except ValueError:
+            return
+        if self.rate:
+            self.tokens = min(self.tokens, remaining)
+        if remaining <= 0:
+            reset = _reset_seconds(headers.get("x-ratelimit-reset"))
+            self.block(reset if reset is not None else 1.0, now)
+
+class RateLimiter:
+    """
+    Client-side scheduler for OpenRouter requests. Each (API key, model)
+    pair has a token bucket; requests wait in a priority queue
+    (INTERACTIVE before BATCH, then first come first served) and the one at
+    the head takes the first pair that is free: the requested model on any
+    key, then the fallback models. A 429 blocks its pair for Retry-After
+    seconds and response headers keep the buckets in step with the server's
+    own count, so a steady load runs at the quota instead of into it.
+    """
+
+    def __init__(self, keys, rate_per_minute=None, burst=None, fallback_models=(), max_wait=60.0, retries=3):
+        self.keys = list(keys)
+        self.rate_per_minute = rate_per_minute
+        self.burst = burst
+        self.fallback_models = list(fallback_models)
+        self.max_wait = max_wait
+        self.retries = retries
+        self.granted = 0
+        self.throttled = 0      # 429s received
+        self.fallbacks = 0      # requests sent with another key or model than asked for
+        self.wait_seconds = 0.0
+        self._buckets = {}
+        self._queue = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _limit(self, model):
+        # OpenRouter's free models allow about 20 requests a minute
+        if self.rate_per_minute is not None:
+            return self.rate_per_minute
+        return 20 if model.endswith(":free") else 0
+
+    def _bucket(self, lane):
+        bucket = self._buckets.get(lane)
+        if bucket is None:
+            limit = self._limit(lane[1])
+            burst = self.burst or max(1, limit // 4)
+            bucket = self._buckets[lane] = TokenBucket(limit / 60, burst)
+        return bucket
+
+    def _best_lane(self, model, now):
+        lanes = [(key, m) for m in [model, *self.fallback_models] for key in self.keys]
+        best, best_wait = None, None
+        for lane in lanes:
+            wait = self._bucket(lane).wait_time(now)
+            if wait <= 0:
+                return lane, 0.0
+            if best_wait is None or wait < best_wait:
+                best, best_wait = lane, wait
+        return best, best_wait
+
+    def acquire(self, model, level=None):
+        """Wait for a turn and a free (key, model) pair and return it; raises RateLimited after max_wait."""
+        if not self.keys:
+            raise RateLimited("no OpenRouter API key")
+        entry = (_priority.get() if level is None else level, next(self._seq))
+        start = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._queue, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = None
+                    if self._queue[0] == entry:
+                        lane, wait = self._best_lane(model, now)
+                        if wait <= 0:
+                            self._bucket(lane).take(now)
+                            heapq.heappop(self._queue)
+                            self.granted += 1
+                            self.fallbacks += lane != (self.keys[0], model)
+                            self.wait_seconds += now - start
+                            return lane
+                    left = start + self.max_wait - now
+                    if left <= 0:
+                        raise RateLimited(f"rate limited: no request slot for {model} within {self.max_wait:g}s")
+                    self._cond.wait(left if wait is None else min(wait, left))
+            finally:
+                if entry in self._queue:
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+                # The next in line may be able to go now
+                self._cond.notify_all()
+
+    def report(self, lane, response):
+        """Update the pair's bucket from a response's status and headers."""
+        with self._cond:
+            now = time.monotonic()
+            bucket = self._bucket(lane)
+            bucket.update(response.headers, now)
+            if response.status_code == 429:
+                self.throttled += 1
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if retry_after is None:
+                    retry_after = 1 / bucket.rate if bucket.rate else 5.0
+                bucket.block(retry_after, now)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "granted": self.granted,
+                "waiting": len(self._queue),
+                "throttled": self.throttled,
+                "fallbacks": self.fallbacks,
+                "avg_wait": self.wait_seconds / self.granted if self.granted else 0.0,
+            }
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+def _split(value):
+    return [v.strip() for v in (value or "").split(",") if v.strip()]
+
+def get_limiter():
+    """
+    The shared limiter. Keys come from OPENROUTER_API_KEYS (comma-separated)
+    or OPENROUTER_API_KEY; OPENROUTER_RATE_LIMIT (requests per minute per key
+    and model, 0 = only follow the server's headers) overrides the default of
+    20 for ":free" models.
+    """
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            rate = os.getenv("OPENROUTER_RATE_LIMIT")
+            burst = os.getenv("OPENROUTER_RATE_BURST")
+            _limiter = RateLimiter(
+                keys=_split(os.getenv("OPENROUTER_API_KEYS")) or _split(os.getenv("OPENROUTER_API_KEY")),
+                rate_per_minute=float(rate) if rate else None,
+                burst=int(burst) if burst else None,
+                fallback_models=_split(os.getenv("OPENROUTER_FALLBACK_MODELS")),
+                max_wait=float(os.getenv("OPENROUTER_RATE_MAX_WAIT", "60")),
+                retries=int(os.getenv("OPENROUTER_RATE_RETRIES", "3")),
+            )
+        return _limiter
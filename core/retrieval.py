@@ -0,0 +1,270 @@
+# core/retrieval.py
+
+import hashlib
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+from models.llm_interface import CHARS_PER_TOKEN, estimate_tokens
+
+DEFAULT_INDEX_DIR = os.path.join(os.path.expanduser("~"), ".cache", "yashbot", "index")
+DOC_EXTENSIONS = (".md", ".markdown", ".txt", ".rst")
+
+def chunk_text(text, max_tokens=200):
+    """Split text into chunks of whole paragraphs (long paragraphs at spaces) of at most max_tokens."""
+    limit = max_tokens * CHARS_PER_TOKEN
+    pieces = []
+    for para in re.split(r"\n\s*\n", text):
+        para = " ".join(para.split())
+        while len(para) > limit:
+            cut = para.rfind(" ", 0, limit)
+            cut = cut if cut > limit // 2 else limit
+            pieces.append(para[:cut])
+            para = para[cut:].lstrip()
+        if para:
+            pieces.append(para)
+
+    chunks, current = [], ""
+    for piece in pieces:
+        if current and len(current) + 2 + len(piece) > limit:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+def embed_model_name():
+    return os.getenv("YASHBOT_EMBED_MODEL") or "default"
+
+def _embed4all():
+    # Embed4All downloads its default model (all-MiniLM-L6-v2) on first use
+    from gpt4all import Embed4All
+    name = embed_model_name()
+    model = Embed4All(None if name == "default" else name)
+    return lambda texts: np.asarray(model.embed(list(texts)), dtype=np.float32)
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+class RetrievalIndex:
+    """
+    Chunk embeddings for every document under docs_dir.
+
+    The vectors live in index_dir/embeddings.npy, opened as a memory map,
+    so the index costs no load time and only the pages search touches stay
+    resident. manifest.json records each file's size, mtime and content
+    hash with its chunks, plus the embedding model and vector size the
+    index was built with. update() re-embeds only files whose content
+    changed and copies every other row across, unless the embedding model
+    changed, which means starting over. search() is one matrix
+    product of the query with the whole (normalized) matrix, i.e. cosine
+    similarity, followed by a partial sort for the top k.
+    """
+
+    def __init__(self, docs_dir, index_dir=DEFAULT_INDEX_DIR, embed=None, chunk_tokens=200, embed_model=None):
+        self.docs_dir = os.path.expanduser(docs_dir)
+        self.embed_model = embed_model or embed_model_name()
+        self.index_dir = os.path.expanduser(index_dir)
+        self.chunk_tokens = chunk_tokens
+        self._embed = embed
+        self._embed_lock = threading.Lock()
+        self._update_lock = threading.RLock()
+        self.matrix_path = os.path.join(self.index_dir, "embeddings.npy")
+        self.manifest_path = os.path.join(self.index_dir, "manifest.json")
+        self.files = {}         # relative path -> {"size", "mtime", "sha256", "start", "count"}
+        self.chunks = []        # (relative path, text), one per matrix row
+        self.matrix = None
+        self.version = ""
+        self._current = (None, [])  # what search() reads, replaced in one assignment
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            matrix = np.load(self.matrix_path, mmap_mode="r") if manifest["chunks"] else None
+        except (OSError, ValueError, KeyError):
+            return
+        if manifest.get("embed_model") != self.embed_model or (
+                matrix is not None and matrix.shape[1] != manifest.get("dim")):
+            # Vectors from another model can't be compared with ours: rebuild
+            return
+        self.files = manifest["files"]
+        self.chunks = [tuple(c) for c in manifest["chunks"]]
+        self.matrix = matrix
+        self.version = manifest.get("version", "")
+        self._current = (matrix, self.chunks)
+
+    def embed(self, texts):
+        with self._embed_lock:
+            if self._embed is None:
+                self._embed = _embed4all()
+            return _normalize(self._embed(texts))
+
+    def _scan(self):
+        found = {}
+        for root, dirs, names in os.walk(self.docs_dir):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            for name in names:
+                if name.lower().endswith(DOC_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    found[os.path.relpath(path, self.docs_dir)] = path
+        return found
+
+    def update(self, rebuild=False):
+        """Bring the index in line with docs_dir. Returns counts of files embedded, kept and removed."""
+        with self._update_lock:
+            old_files, old_chunks, old_matrix = self.files, self.chunks, self.matrix
+            if rebuild:
+                old_files, old_chunks, old_matrix = {}, [], None
+            files, chunks, rows = {}, [], []
+            embedded = kept = 0
+
+            for rel, path in sorted(self._scan().items()):
+                stat = os.stat(path)
+                entry = old_files.get(rel)
+                data = None
+                if entry and (entry["size"], entry["mtime"]) == (stat.st_size, stat.st_mtime):
+                    sha = entry["sha256"]
+                else:
+                    with open(path, "rb") as f:
+                        data = f.read()
+                    sha = hashlib.sha256(data).hexdigest()
+
+                start = len(chunks)
+                if entry and entry["sha256"] == sha and (old_matrix is not None or not entry["count"]):
+                    # Unchanged (maybe just touched): reuse its vectors
+                    end = entry["start"] + entry["count"]
+                    piece = old_matrix[entry["start"]:end] if entry["count"] else None
+                    chunks.extend(old_chunks[entry["start"]:end])
+                    kept += 1
+                else:
+                    if data is None:
+                        with open(path, "rb") as f:
+                            data = f.read()
+                    texts = chunk_text(data.decode("utf-8", errors="replace"), self.chunk_tokens)
+                    piece = self.embed(texts) if texts else None
+                    chunks.extend((rel, t) for t in texts)
+                    embedded += 1
+                if piece is not None and len(piece):
+                    rows.append(piece)
+                files[rel] = {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": sha,
+                              "start": start, "count": len(chunks) - start}
+
+            if len({piece.shape[1] for piece in rows}) > 1:
+                # The embedding model's output size changed under us
+                return self.update(rebuild=True)
+            removed = len(set(self.files) - set(files))
+            if files != old_files or not os.path.exists(self.manifest_path):
+                self._save(files, chunks, rows)
+            return {"embedded": embedded, "kept": kept, "removed": removed, "chunks": len(chunks)}
+
+    def _save(self, files, chunks, rows):
+        os.makedirs(self.index_dir, exist_ok=True)
+        matrix = None
+        if chunks:
+            dim = rows[0].shape[1]
+            tmp = self.matrix_path + ".tmp.npy"
+            out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(len(chunks), dim))
+            row = 0
+            for piece in rows:
+                out[row:row + len(piece)] = piece
+                row += len(piece)
+            out.flush()
+            del out
+            os.replace(tmp, self.matrix_path)
+            matrix = np.load(self.matrix_path, mmap_mode="r")
+
+        version = hashlib.sha256(json.dumps([self.embed_model, sorted((k, v["sha256"]) for k, v in files.items())])
+                                 .encode()).hexdigest()[:16]
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": version, "embed_model": self.embed_model,
+                       "dim": int(matrix.shape[1]) if matrix is not None else 0,
+                       "files": files, "chunks": chunks}, f)
+        os.replace(tmp, self.manifest_path)
+        self.files, self.chunks, self.matrix, self.version = files, [tuple(c) for c in chunks], matrix, version
+        self._current = (matrix, self.chunks)
+
+    def search(self, query, k=3, min_score=0.0):
+        """The k chunks most similar to query, as (score, path, text), best first."""
+        matrix, chunks = self._current
+        if matrix is None or not len(chunks):
+            return []
+        query = self.embed([query])[0]
+        if query.shape[0] != matrix.shape[1]:
+            return []   # built with another embedding model; update() rebuilds it
+        scores = matrix @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), *chunks[i]) for i in top if scores[i] >= min_score]
+
+    def context(self, query, k=3, max_tokens=300, min_score=0.3):
+        """The best chunks for query as prompt text, cut to fit max_tokens ("" if none match)."""
+        parts, budget = [], max_tokens
+        for score, path, text in self.search(query, k, min_score):
+            entry = f"[{path}] {text}"
+            if estimate_tokens(entry) > budget:
+                entry = entry[:max(0, budget - 1) * CHARS_PER_TOKEN].rstrip()
+            if entry:
+                parts.append(entry)
+                budget -= estimate_tokens(entry)
+            if budget <= 1:
+                break
+        return "\n\n".join(parts)
+
+    def stats(self):
+        return {"files": len(self.files), "chunks": len(self.chunks), "version": self.version,
+                "dim": int(self.matrix.shape[1]) if self.matrix is not None else 0}
+
+_index = None
+_index_lock = threading.Lock()
+
+def retrieval_enabled():
+    return bool(os.getenv("YASHBOT_DOCS_DIR"))
+
+def get_index(update=True):
+    """
+    The index of YASHBOT_DOCS_DIR (None if unset). The saved index is used
+    straight away; with update, changed files are re-embedded in a
+    background thread the first time.
+    """
+    global _index
+    if not retrieval_enabled():
+        return None
+    with _index_lock:
+        if _index is None:
+            _index = RetrievalIndex(os.getenv("YASHBOT_DOCS_DIR"),
+                                    os.getenv("YASHBOT_INDEX_DIR", DEFAULT_INDEX_DIR))
+            if update:
+                threading.Thread(target=_background_update, args=(_index,),
+                                 name="yashbot-index", daemon=True).start()
+        return _index
+
+def _background_update(index):
+    # A failed update leaves the previous index in place
+    try:
+        index.update()
+    except Exception:
+        pass
+
+def grounding(prompt):
+    """
+    Context for an offline prompt: the top YASHBOT_RETRIEVAL_K chunks, at
+    most YASHBOT_RETRIEVAL_TOKENS tokens in all. "" without an index or a match.
+    """
+    index = get_index()
+    if index is None or index.matrix is None:
+        return ""
+    return index.context(
+        prompt,
+        k=int(os.getenv("YASHBOT_RETRIEVAL_K", "3")),
+        max_tokens=int(os.getenv("YASHBOT_RETRIEVAL_TOKENS", "300")),
+        min_score=float(os.getenv("YASHBOT_RETRIEVAL_MIN_SCORE", "0.3")),
+    )
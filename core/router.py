@@ -0,0 +1,241 @@
+# core/router.py
+
+import contextvars
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+from core.backends import get_backend, remember_backend, reset_backend
+
+class BackendHealth:
+    """Rolling time-to-first-token and error rate for one backend."""
+
+    def __init__(self, window=50):
+        self.samples = deque(maxlen=window)     # (latency or None, ok)
+        self.last_attempt = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, latency, ok):
+        with self._lock:
+            self.samples.append((latency, ok))
+
+    @property
+    def error_rate(self):
+        with self._lock:
+            if not self.samples:
+                return 0.0
+            return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+    def latency(self, quantile=0.5):
+        with self._lock:
+            latencies = sorted(l for l, ok in self.samples if ok)
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, int(quantile * len(latencies)))]
+
+    def stats(self):
+        return {
+            "samples": len(self.samples),
+            "error_rate": round(self.error_rate, 3),
+            "p50": round(self.latency(0.5), 3),
+            "p99": round(self.latency(0.99), 3),
+        }
+
+class _StreamPump:
+    """Runs one backend stream on a thread and forwards its chunks to a queue."""
+
+    def __init__(self, name, stream, prompt, events, kwargs=None):
+        self.name = name
+        self.started = time.perf_counter()
+        self._cancelled = threading.Event()
+        self._stream = stream
+        self._prompt = prompt
+        self._kwargs = kwargs or {}
+        self._events = events
+        # Run in a copy of the caller's context so backend spans join its trace
+        context = contextvars.copy_context()
+        threading.Thread(target=context.run, args=(self._run,), name=f"yashbot-route-{name}", daemon=True).start()
+
+    def cancel(self):
+        # Takes effect at the backend's next chunk; closing the stream then
+        # aborts the HTTP response / local generation.
+        self._cancelled.set()
+
+    def _run(self):
+        stream = None
+        try:
+            stream = self._stream(self._prompt, **self._kwargs)
+            for chunk in stream:
+                if self._cancelled.is_set():
+                    return
+                self._events.put((self, "chunk", chunk))
+            self._events.put((self, "end", None))
+        except Exception as e:
+            self._events.put((self, "error", e))
+        finally:
+            if stream is not None and hasattr(stream, "close"):
+                stream.close()
+
+def _is_error(chunk):
+    # Backends report failures as "⚠ ..." text rather than raising
+    return chunk.startswith("⚠")
+
+class HybridRouter:
+    """
+    Routes each prompt to the backend with the lowest rolling p50
+    time-to-first-token among the healthy ones. If the chosen backend
+    fails, or hasn't produced a first token within `deadline` seconds, the
+    other backend takes over. With hedging, the other backend also starts
+    after `hedge_delay` seconds, the first one to produce a token wins and
+    the loser is cancelled.
+
+    A backend whose recent error rate exceeds max_error_rate is skipped,
+    but still probed every probe_interval seconds so it can recover.
+    """
+
+    def __init__(self, backends=("online", "offline"), deadline=8.0, hedge=False,
+                 hedge_delay=1.0, max_error_rate=0.5, probe_interval=30.0, window=50):
+        self.backends = list(backends)
+        self.deadline = deadline
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.max_error_rate = max_error_rate
+        self.probe_interval = probe_interval
+        self.health = {name: BackendHealth(window) for name in self.backends}
+
+    def _usable(self, name):
+        health = self.health[name]
+        if health.error_rate <= self.max_error_rate:
+            return True
+        return time.monotonic() - health.last_attempt > self.probe_interval
+
+    def order(self):
+        """Backends in the order they should be tried for the next prompt."""
+        usable = [b for b in self.backends if self._usable(b)] or list(self.backends)
+        ranked = sorted(usable, key=lambda b: self.health[b].latency())
+        return ranked + [b for b in self.backends if b not in ranked]
+
+    def _start(self, name, prompt, events, pumps, kwargs):
+        self.health[name].last_attempt = time.monotonic()
+        pumps.append(_StreamPump(name, get_backend(name, stream=True), prompt, events, kwargs))
+
+    def chat_stream(self, prompt, remember=True, **options):
+        """
+        Stream the reply from whichever backend wins. With remember, the
+        finished exchange is also added to the other backends' memories, so
+        a later fallback still knows the conversation. Other keyword
+        arguments (temperature, max_tokens, stop) go to every backend.
+        """
+        kwargs = {"remember": remember, **options}
+        events = queue.Queue()
+        candidates = self.order()
+        pumps = []
+        self._start(candidates.pop(0), prompt, events, pumps, kwargs)
+
+        now = time.monotonic()
+        deadline = now + self.deadline
+        hedge_at = now + self.hedge_delay if self.hedge and candidates else None
+        winner = first = last_error = None
+
+        # Phase 1: race for the first token
+        while winner is None:
+            wake = min(deadline, hedge_at or deadline)
+            timeout = None if wake == float("inf") else max(0.0, wake - time.monotonic())
+            try:
+                pump, kind, payload = events.get(timeout=timeout)
+            except queue.Empty:
+                if hedge_at is not None and time.monotonic() >= hedge_at:
+                    hedge_at = None
+                    self._start(candidates.pop(0), prompt, events, pumps, kwargs)
+                    continue
+                # Deadline: give up on slow backends and fall back
+                for pump in pumps:
+                    self.health[pump.name].record(None, False)
+                    pump.cancel()
+                pumps = []
+                last_error = f"no response within {self.deadline:.0f}s"
+                if not candidates:
+                    yield f"⚠ Error in hybrid response: {last_error}"
+                    return
+                self._start(candidates.pop(0), prompt, events, pumps, kwargs)
+                deadline = float("inf")  # the fallback gets as long as it needs
+                continue
+
+            if pump not in pumps:
+                continue  # late output from a cancelled backend
+            if kind == "chunk" and not _is_error(payload):
+                winner, first = pump, payload
+                self.health[pump.name].record(time.perf_counter() - pump.started, True)
+                break
+
+            # Error or empty reply: this backend is out of the race
+            self.health[pump.name].record(None, False)
+            pump.cancel()
+            pumps.remove(pump)
+            last_error = payload if kind == "chunk" else (str(payload) if payload else "empty reply")
+            if not pumps:
+                if not candidates:
+                    yield last_error if _is_error(last_error) else f"⚠ Error in hybrid response: {last_error}"
+                    return
+                hedge_at = None
+                self._start(candidates.pop(0), prompt, events, pumps, kwargs)
+
+        for pump in pumps:
+            if pump is not winner:
+                pump.cancel()
+
+        # Phase 2: relay the winner's stream
+        yield first
+        reply = [first]
+        try:
+            while True:
+                pump, kind, payload = events.get()
+                if pump is not winner:
+                    continue
+                if kind == "chunk":
+                    reply.append(payload)
+                    yield payload
+                elif kind == "error":
+                    yield f" ⚠ {payload}"
+                    return
+                else:
+                    break
+        finally:
+            winner.cancel()
+        if remember:
+            for name in self.backends:
+                if name != winner.name:
+                    remember_backend(name, prompt, "".join(reply))
+
+    def chat(self, prompt, remember=True, **options):
+        return "".join(self.chat_stream(prompt, remember, **options))
+
+    def stats(self):
+        return {name: health.stats() for name, health in self.health.items()}
+
+_router = None
+_router_lock = threading.Lock()
+
+def get_router():
+    """Shared router configured from YASHBOT_HYBRID_* environment variables."""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = HybridRouter(
+                deadline=float(os.getenv("YASHBOT_HYBRID_DEADLINE", "8")),
+                hedge=os.getenv("YASHBOT_HYBRID_HEDGE", "0") == "1",
+                hedge_delay=float(os.getenv("YASHBOT_HYBRID_HEDGE_DELAY", "1")),
+            )
+        return _router
+
+def hybrid_chat(prompt, remember=True, **options):
+    return get_router().chat(prompt, remember, **options)
+
+def hybrid_chat_stream(prompt, remember=True, **options):
+    return get_router().chat_stream(prompt, remember, **options)
+
+def reset_chat():
+    for name in get_router().backends:
+        reset_backend(name)
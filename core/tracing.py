@@ -0,0 +1,271 @@
+# core/tracing.py
+
+import contextlib
+import contextvars
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+from collections import defaultdict
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "yashbot", "traces.jsonl")
+
+# Histogram buckets in seconds (Prometheus-style cumulative "le" buckets)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_enabled = os.getenv("YASHBOT_TRACE", "0") == "1"
+_path = None
+_current = contextvars.ContextVar("yashbot_trace", default=None)
+_ids = itertools.count(1)
+
+class Metrics:
+    """Counters and histograms keyed by name and labels, dumpable as Prometheus text."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, metric, value=1.0, **labels):
+        with self._lock:
+            self.counters[(metric, tuple(sorted(labels.items())))] += value
+
+    def observe(self, metric, value, **labels):
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    hist[0][i] += 1
+            hist[1] += value
+            hist[2] += 1
+
+    def prometheus_text(self):
+        lines = []
+        with self._lock:
+            for name in sorted({n for n, _ in self.counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (n, labels), value in sorted(self.counters.items()):
+                    if n == name:
+                        lines.append(f"{name}{_labels(labels)} {value:g}")
+            for name in sorted({n for n, _ in self.histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (n, labels), (counts, total, count) in sorted(self.histograms.items()):
+                    if n != name:
+                        continue
+                    for bound, c in zip(self.buckets, counts):
+                        lines.append(f"{name}_bucket{_labels(labels + (('le', f'{bound:g}'),))} {c}")
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+                    lines.append(f"{name}_sum{_labels(labels)} {total:g}")
+                    lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+metrics = Metrics()
+
+class Span:
+    __slots__ = ("name", "start", "duration", "attrs")
+
+    def __init__(self, name, start, attrs):
+        self.name = name
+        self.start = start
+        self.duration = None
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+class Trace:
+    """
+    One chat turn: a list of timed spans, written as one JSONL record and
+    folded into the metrics when it finishes.
+    """
+
+    def __init__(self, name, attrs):
+        self.id = next(_ids)
+        self.name = name
+        self.attrs = attrs
+        self.wall = time.time()
+        self.start = time.perf_counter()
+        self.spans = []
+        self._finished = False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    @contextlib.contextmanager
+    def span(self, name, **attrs):
+        span = Span(name, time.perf_counter(), attrs)
+        try:
+            yield span
+        finally:
+            span.duration = time.perf_counter() - span.start
+            self.spans.append(span)
+
+    def record(self, name, duration, start=None, **attrs):
+        """Add a span measured elsewhere (e.g. render time summed over chunks)."""
+        span = Span(name, start if start is not None else time.perf_counter() - duration, attrs)
+        span.duration = duration
+        self.spans.append(span)
+
+    @contextlib.contextmanager
+    def activate(self):
+        """Make this the current trace for spans opened in this thread."""
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+    def finish(self, **attrs):
+        if self._finished:
+            return
+        self._finished = True
+        self.attrs.update(attrs)
+        duration = time.perf_counter() - self.start
+        mode = self.attrs.get("mode", "")
+        metrics.inc("yashbot_traces_total", name=self.name, mode=mode)
+        metrics.observe("yashbot_trace_seconds", duration, name=self.name, mode=mode)
+        for span in self.spans:
+            metrics.observe("yashbot_span_seconds", span.duration, span=span.name)
+            if "tokens" in span.attrs:
+                metrics.inc("yashbot_tokens_total", span.attrs["tokens"], span=span.name)
+        _write({
+            "trace_id": self.id,
+            "name": self.name,
+            "time": self.wall,
+            "duration": round(duration, 6),
+            **self.attrs,
+            "spans": [
+                {"name": s.name, "offset": round(s.start - self.start, 6),
+                 "duration": round(s.duration, 6), **s.attrs}
+                for s in self.spans
+            ],
+        })
+
+class _NoopSpan:
+    """Returned when tracing is off, so instrumented code costs one check."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+    def span(self, name, **attrs):
+        return self
+
+    def record(self, name, duration, start=None, **attrs):
+        pass
+
+    def activate(self):
+        return self
+
+    def finish(self, **attrs):
+        pass
+
+NOOP = _NoopSpan()
+
+def enabled():
+    return _enabled
+
+def configure(enable=True, path=None):
+    """Turn tracing on or off at runtime (it defaults to YASHBOT_TRACE=1)."""
+    global _enabled, _path, _logger
+    _enabled = enable
+    if path is not None:
+        with _logger_lock:
+            _path = path
+            _logger = None
+
+def start(name="chat", **attrs):
+    """Start a trace (the no-op trace if tracing is off). Call finish() when done."""
+    if not _enabled:
+        return NOOP
+    return Trace(name, attrs)
+
+@contextlib.contextmanager
+def trace(name="chat", **attrs):
+    """Start, activate and finish a trace around a block."""
+    t = start(name, **attrs)
+    with t.activate():
+        try:
+            yield t
+        finally:
+            t.finish()
+
+def current():
+    return _current.get() if _enabled else None
+
+def span(name, **attrs):
+    """Time a stage of the current trace; a no-op outside a trace or when tracing is off."""
+    if not _enabled:
+        return NOOP
+    t = _current.get()
+    return t.span(name, **attrs) if t is not None else NOOP
+
+def timed_stream(chunks, prefill="prefill", generation="generation"):
+    """
+    Pass a token stream through, recording the wait for the first token as
+    `prefill` and the rest, with its token count, as `generation`.
+    """
+    t = current()
+    if t is None:
+        return chunks
+    return _timed_stream(t, chunks, prefill, generation)
+
+def _timed_stream(t, chunks, prefill, generation):
+    start = time.perf_counter()
+    first = None
+    tokens = 0
+    try:
+        for chunk in chunks:
+            if first is None:
+                first = time.perf_counter()
+                t.record(prefill, first - start, start)
+            tokens += 1
+            yield chunk
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+        if first is not None:
+            t.record(generation, time.perf_counter() - first, first, tokens=tokens)
+
+_logger = None
+_logger_lock = threading.Lock()
+
+def _write(record):
+    global _logger
+    with _logger_lock:
+        if _logger is None:
+            path = os.path.expanduser(_path or os.getenv("YASHBOT_TRACE_PATH", DEFAULT_PATH))
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(
+                path,
+                maxBytes=int(os.getenv("YASHBOT_TRACE_MAX_BYTES", str(10 * 2**20))),
+                backupCount=int(os.getenv("YASHBOT_TRACE_BACKUPS", "3")),
+                encoding="utf-8",
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            _logger = logging.getLogger("yashbot.trace")
+            _logger.handlers[:] = [handler]
+            _logger.propagate = False
+            _logger.setLevel(logging.INFO)
+    _logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+def prometheus_text():
+    return metrics.prometheus_text()
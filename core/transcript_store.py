@@ -0,0 +1,242 @@
+# core/transcript_store.py
+
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "yashbot", "transcripts.sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY, started REAL NOT NULL, mode TEXT, ui TEXT);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY, session TEXT NOT NULL, role TEXT NOT NULL,
+    text TEXT NOT NULL, time REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS messages_session ON messages(session, id);
+CREATE INDEX IF NOT EXISTS messages_time ON messages(time);
+CREATE INDEX IF NOT EXISTS sessions_started ON sessions(started);
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    text, content='messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2');
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts(rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+def _connect(path):
+    db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    return db
+
+def fts_query(text):
+    """Plain words -> an FTS5 query matching all of them (the last one as a prefix)."""
+    terms = ['"' + t.replace('"', '""') + '"' for t in text.split()]
+    if terms:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+class TranscriptStore:
+    """
+    Every chat message, appended to SQLite with a full-text index.
+
+    add() only queues the message; a writer thread commits whatever has
+    queued up in one transaction, so the chat loop never waits on disk.
+    Reads use their own connection (WAL lets them run alongside the
+    writer). Sessions are paged newest-first by message id, so loading the
+    last page of a long chat is one index range scan.
+
+    Retention: compact() deletes messages older than retention_days and
+    the oldest beyond max_messages (0 = keep), then merges the FTS index
+    and shrinks the file once a quarter of it is free. It runs once when
+    the store opens.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, retention_days=0, max_messages=0):
+        self.path = path
+        self.retention_days = retention_days
+        self.max_messages = max_messages
+        self.written = 0
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._writer_db = _connect(path)
+        self._writer_db.executescript(_SCHEMA)
+        self._writer_db.commit()
+        self._write_lock = threading.Lock()
+        if path == ":memory:":
+            # One connection for everything, so reads wait for writes
+            self._db, self._read_lock = self._writer_db, self._write_lock
+        else:
+            self._db, self._read_lock = _connect(path), threading.Lock()
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._write_loop, name="yashbot-transcripts", daemon=True)
+        self._thread.start()
+        self._queue.put(("compact",))
+
+    # ——— writing ———
+
+    def start_session(self, mode="", ui=""):
+        """A new session id; the session row is written in the background."""
+        session = uuid.uuid4().hex
+        self._queue.put(("session", session, time.time(), mode, ui))
+        return session
+
+    def add(self, session, role, text):
+        """Queue a message ("user", "assistant" or "system") for writing."""
+        if text:
+            self._queue.put(("message", session, role, text, time.time()))
+
+    def compact(self):
+        """Queue a retention/compaction pass."""
+        self._queue.put(("compact",))
+
+    def flush(self):
+        """Wait until everything queued so far is on disk."""
+        self._queue.join()
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 1000:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except sqlite3.Error:
+                pass    # a transcript is never worth crashing the chat for
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if batch[-1] is None:
+                return
+
+    def _write(self, batch):
+        db = self._writer_db
+        with self._write_lock:
+            with db:
+                for item in batch:
+                    if item is None or item[0] == "compact":
+                        continue
+                    if item[0] == "session":
+                        db.execute("INSERT OR IGNORE INTO sessions VALUES (?, ?, ?, ?)", item[1:])
+                    else:
+                        db.execute("INSERT INTO messages (session, role, text, time) VALUES (?, ?, ?, ?)", item[1:])
+                        self.written += 1
+            if any(item is not None and item[0] == "compact" for item in batch):
+                self._compact()
+
+    def _compact(self):
+        db = self._writer_db
+        with db:
+            if self.retention_days:
+                db.execute("DELETE FROM messages WHERE time < ?", (time.time() - self.retention_days * 86400,))
+            if self.max_messages:
+                db.execute("DELETE FROM messages WHERE id <= (SELECT id FROM messages ORDER BY id DESC "
+                           "LIMIT 1 OFFSET ?)", (self.max_messages,))
+            db.execute("DELETE FROM sessions WHERE started < ? AND NOT EXISTS "
+                       "(SELECT 1 FROM messages WHERE session = sessions.id)", (time.time() - 86400,))
+            db.execute("INSERT INTO messages_fts(messages_fts) VALUES ('optimize')")
+        # Rewrite the file once a quarter of it is free space
+        free = db.execute("PRAGMA freelist_count").fetchone()[0]
+        if free * 4 > db.execute("PRAGMA page_count").fetchone()[0]:
+            db.execute("VACUUM")
+        db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    # ——— reading ———
+
+    def _query(self, sql, params=()):
+        with self._read_lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def page(self, session, before=None, limit=50):
+        """
+        Up to `limit` messages of a session older than message id `before`
+        (newest if None), oldest first, as (id, role, text, time) rows.
+        Returns (rows, cursor); pass cursor as `before` for the previous
+        page. cursor is None when there is nothing older.
+        """
+        rows = self._query(
+            "SELECT id, role, text, time FROM messages WHERE session = ? AND id < ? "
+            "ORDER BY id DESC LIMIT ?",
+            (session, before if before is not None else 1 << 62, limit + 1),
+        )
+        more = len(rows) > limit
+        rows = rows[:limit][::-1]
+        return rows, (rows[0][0] if more and rows else None)
+
+    def sessions(self, limit=20, offset=0):
+        """Most recent sessions with a message, as dicts (id, started, mode, ui, title)."""
+        rows = self._query(
+            "SELECT s.id, s.started, s.mode, s.ui, "
+            " (SELECT text FROM messages WHERE session = s.id AND role = 'user' ORDER BY id LIMIT 1) "
+            "FROM sessions s WHERE EXISTS (SELECT 1 FROM messages WHERE session = s.id) "
+            "ORDER BY s.started DESC LIMIT ? OFFSET ?",
+            (limit, offset),
+        )
+        return [dict(zip(("id", "started", "mode", "ui", "title"), row)) for row in rows]
+
+    def search(self, text, limit=20, session=None):
+        """
+        Messages matching all the words in `text`, newest first, as dicts
+        (id, session, role, time, snippet). The matched words are wrapped
+        in [brackets] in the snippet.
+        """
+        query = fts_query(text)
+        if not query:
+            return []
+        sql = ("SELECT m.id, m.session, m.role, m.time, "
+               " snippet(messages_fts, 0, '[', ']', '…', 12) "
+               "FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid "
+               "WHERE messages_fts MATCH ?")
+        params = [query]
+        if session is not None:
+            sql += " AND m.session = ?"
+            params.append(session)
+        # rowid order follows the index's own order, so no ranking pass over every match
+        sql += " ORDER BY messages_fts.rowid DESC LIMIT ?"
+        params.append(limit)
+        try:
+            rows = self._query(sql, params)
+        except sqlite3.OperationalError:
+            return []
+        return [dict(zip(("id", "session", "role", "time", "snippet"), row)) for row in rows]
+
+    def stats(self):
+        messages, sessions = self._query(
+            "SELECT (SELECT count(*) FROM messages), (SELECT count(*) FROM sessions)")[0]
+        return {"messages": messages, "sessions": sessions, "pending": self._queue.qsize(),
+                "written": self.written}
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+_store = None
+_store_lock = threading.Lock()
+
+def transcripts_enabled():
+    return os.getenv("YASHBOT_TRANSCRIPTS", "1") != "0"
+
+def get_store():
+    """The shared transcript store, configured from the environment on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = TranscriptStore(
+                path=os.path.expanduser(os.getenv("YASHBOT_TRANSCRIPT_PATH", DEFAULT_PATH)),
+                retention_days=float(os.getenv("YASHBOT_TRANSCRIPT_RETENTION_DAYS", "0")),
+                max_messages=int(os.getenv("YASHBOT_TRANSCRIPT_MAX_MESSAGES", "0")),
+            )
+            # Write out anything still queued when the program exits
+            atexit.register(_store.close)
+        return _store
@@ -1,23 +1,162 @@
 #!/usr/bin/env python3
+import time
+_START = time.perf_counter()
+
 import sys
-import datetime
+import argparse
 
-from core.online_model import online_chat
-from core.offline_model import offline_chat
+from core.backends import get_backend, warm_backend, reset_backend, load_times
+from core.cache import cache_enabled, get_cache
+from core import tracing
+from core.intents import answer_locally, get_engine
+from core.transcript_store import get_store, transcripts_enabled
 from dotenv import load_dotenv
 load_dotenv()
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="YashBot command-line chat")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print cold-start timings and exit once the chosen backend is ready")
+    parser.add_argument("--mode", choices=("online", "offline", "hybrid"),
+                        help="skip the interactive mode prompt")
+    parser.add_argument("--preload-offline", action="store_true",
+                        help="start loading the local model while you choose a mode")
+    parser.add_argument("--reindex", action="store_true",
+                        help="update the YASHBOT_DOCS_DIR retrieval index and exit")
+    parser.add_argument("--autotune", nargs="?", const="", metavar="MODEL",
+                        help="find the fastest thread/batch/context settings for a local model "
+                             "(default: the active one) on this machine, save them and exit")
+
+    batch = parser.add_argument_group("batch mode")
+    batch.add_argument("--batch", metavar="IN_JSONL",
+                       help="answer every record of a JSONL file instead of chatting")
+    batch.add_argument("--out", metavar="OUT_JSONL",
+                       help="where to append results (rerun to resume)")
+    batch.add_argument("--workers", type=int, default=4,
+                       help="prompts in flight at once (default: 4)")
+    batch.add_argument("--prompt-field", default="prompt",
+                       help="JSON field holding the prompt (default: prompt)")
+    args = parser.parse_args(argv)
+    if args.batch and not args.out:
+        parser.error("--batch requires --out")
+    return args
+
+def run_batch_mode(args):
+    from core.batch import run_batch
+    mode = args.mode or "online"
+    print(f"📦 Batch: {args.batch} → {args.out} ({mode}, {args.workers} workers)", file=sys.stderr)
+    summary = run_batch(args.batch, args.out, mode=mode, workers=args.workers,
+                        prompt_field=args.prompt_field)
+    print(f"✅ Done: {summary}", file=sys.stderr)
+
+def run_reindex():
+    from core.retrieval import get_index
+    index = get_index(update=False)
+    if index is None:
+        print("⚠ Set YASHBOT_DOCS_DIR to the folder of documents to index.", file=sys.stderr)
+        return
+    start = time.perf_counter()
+    summary = index.update()
+    print(f"📚 Indexed {index.docs_dir} in {time.perf_counter() - start:.1f}s: {summary}", file=sys.stderr)
+
+def run_autotune(name):
+    from models.autotune import autotune
+    from models.model_manager import get_manager
+    spec = get_manager().spec(name or None)
+    profile = autotune(spec, log=lambda line: print(line, file=sys.stderr))
+    print(f"✅ Saved for {spec.name}: n_threads={profile['n_threads']} n_batch={profile['n_batch']} "
+          f"n_ctx={profile['n_ctx']} (prefill {profile['prefill_tps']} tok/s, "
+          f"decode {profile['decode_tps']} tok/s)", file=sys.stderr)
+
 # ——— Model Selection ———
-print("🤖 Choose your AI model:")
-print("1. Online (requires Internet)")
-print("2. Offline (local GPT4All)")
-mode = input("Enter 1 or 2: ").strip()
-chat_model = online_chat if mode == "1" else offline_chat
-print(f"✅ Using {'Online' if mode == '1' else 'Offline'} mode.\n")
+def select_mode():
+    print("🤖 Choose your AI model:")
+    print("1. Online (requires Internet)")
+    print("2. Offline (local GPT4All)")
+    print("3. Hybrid (fastest healthy backend, falls back to offline)")
+    mode = input("Enter 1, 2 or 3: ").strip()
+    return {"1": "online", "3": "hybrid"}.get(mode, "offline")
+
+def print_startup_profile(timings):
+    print("⏱ Startup profile:")
+    for stage, seconds in timings.items():
+        print(f"   {stage:<22} {seconds * 1000:8.1f} ms")
+
+def switch_model_command(mode, name):
+    """/model lists the models; /model NAME switches (local models load in the background)."""
+    from models.model_manager import get_manager
+    manager = get_manager()
+    if not name:
+        if mode in ("online", "hybrid"):
+            from core import online_model
+            print("YashBot: 🌐 Online model:", online_model.MODEL)
+        if mode in ("offline", "hybrid"):
+            for model_name in manager.specs:
+                marks = ("*" if model_name == manager.active else " ") + ("L" if manager.is_loaded(model_name) else " ")
+                print(f"   {marks} {model_name}")
+            print("YashBot: 💻 Local models:", manager.stats())
+        return
+
+    if name in manager.specs and mode != "online":
+        from models.llm_interface import switch_model
+        switch_model(name)
+        state = "already loaded" if manager.is_loaded(name) else "loading in the background"
+        print(f"YashBot: 🔁 Switching to {name} ({state}).")
+    elif mode == "offline":
+        print(f"YashBot: ⚠ Unknown local model: {name}")
+    else:
+        from core import online_model
+        online_model.set_model(name)
+        print(f"YashBot: 🔁 Online model set to {name}.")
+
+def search_history(store, query):
+    """/search WORDS: the newest saved messages containing all the words."""
+    store.flush()
+    start = time.perf_counter()
+    hits = store.search(query, limit=10)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"YashBot: 🔎 {len(hits)} match{'es' if len(hits) != 1 else ''} ({elapsed:.1f} ms)")
+    for hit in hits:
+        when = time.strftime("%Y-%m-%d %H:%M", time.localtime(hit["time"]))
+        print(f"   {when} {hit['role']:>9}: {hit['snippet']}")
 
 # ——— Chat Loop ———
-def main():
-    print("🤖 YashBot is ready! Type 'exit' or 'quit' to stop.")
+def main(argv=None):
+    args = parse_args(argv)
+    if args.batch:
+        return run_batch_mode(args)
+    if args.reindex:
+        return run_reindex()
+    if args.autotune is not None:
+        return run_autotune(args.autotune)
+
+    timings = {"imports": time.perf_counter() - _START}
+
+    warm_thread = warm_backend("offline") if args.preload_offline else None
+
+    mode = args.mode or select_mode()
+    chat_stream = get_backend(mode, stream=True)
+    timings["backend import"] = load_times.get(mode, 0.0)
+    print(f"✅ Using {mode.capitalize()} mode.\n")
+
+    # Keep loading the local model while the user types their first message
+    if mode in ("offline", "hybrid"):
+        warm_thread = warm_backend("offline")
+
+    if args.profile_startup:
+        if warm_thread is not None:
+            wait_start = time.perf_counter()
+            warm_thread.join()
+            timings["model load (wait)"] = time.perf_counter() - wait_start
+        timings["total"] = time.perf_counter() - _START
+        print_startup_profile(timings)
+        return
+
+    # Every turn is saved (in the background) for /search and the GUI's history
+    store = get_store() if transcripts_enabled() else None
+    session = store.start_session(mode, "cli") if store else None
+
+    print("🤖 YashBot is ready! Type 'exit' or 'quit' to stop, '/reset' to start over.")
     try:
         while True:
             user_input = input("You: ").strip()
@@ -25,17 +164,90 @@ def main():
                 print("👋 Exiting YashBot. Goodbye!")
                 break
 
-            if any(keyword in user_input.lower() for keyword in ("date", "today", "time", "now")):
-                now = datetime.datetime.now()
-                print("YashBot:", now.strftime("%A, %B %d, %Y at %H:%M:%S"))
+            if user_input.lower() == "/reset":
+                reset_backend(mode)
+                if store:
+                    session = store.start_session(mode, "cli")
+                print("YashBot: 🧹 Conversation reset.")
                 continue
 
-            response = chat_model(user_input)
-            print("YashBot:", response)
+            if user_input.lower() == "/router" and mode == "hybrid":
+                from core.router import get_router
+                print("YashBot: 🔀 Backends:", get_router().stats())
+                continue
+
+            if user_input.lower() == "/ratelimit" and mode in ("online", "hybrid"):
+                from core.rate_limit import get_limiter
+                print("YashBot: 🚦 OpenRouter rate limiter:", get_limiter().stats())
+                continue
+
+            if user_input.lower() == "/cache":
+                stats = get_cache().stats() if cache_enabled() else "disabled"
+                print("YashBot: 🗄 Cache:", stats)
+                continue
+
+            if user_input.lower() == "/memory":
+                from core import offline_model, online_model
+                memories = {"online": online_model.memory, "offline": offline_model.memory}
+                for name in (("online", "offline") if mode == "hybrid" else (mode,)):
+                    print(f"YashBot: 🧠 {name.capitalize()} memory:", memories[name]().stats())
+                continue
+
+            if user_input.lower() == "/metrics":
+                if not tracing.enabled():
+                    print("YashBot: 📈 Tracing is off (set YASHBOT_TRACE=1).")
+                else:
+                    print(tracing.prometheus_text(), end="")
+                continue
+
+            if user_input.lower() == "/model" or user_input.lower().startswith("/model "):
+                switch_model_command(mode, user_input[len("/model"):].strip())
+                continue
+
+            if user_input.lower().startswith("/search ") and store:
+                search_history(store, user_input[len("/search "):])
+                continue
+
+            if user_input.lower() == "/docs":
+                from core.retrieval import get_index
+                index = get_index()
+                print("YashBot: 📚 Docs index:", index.stats() if index else "off (set YASHBOT_DOCS_DIR)")
+                continue
+
+            if user_input.lower() == "/intents":
+                print("YashBot: ⚡ Local answers:", get_engine().stats())
+                continue
+
+            with tracing.trace("chat", mode=mode) as turn:
+                # Dates, clock, CPU/RAM/disk and the like never need a model
+                with tracing.span("intent") as span:
+                    local_answer = answer_locally(user_input)
+                    span.set(hit=local_answer is not None)
+                if local_answer is not None:
+                    print("YashBot:", local_answer)
+                    if store:
+                        store.add(session, "user", user_input)
+                        store.add(session, "assistant", local_answer)
+                    continue
+
+                print("YashBot: ", end="", flush=True)
+                render = 0.0
+                reply = []
+                for chunk in chat_stream(user_input):
+                    start = time.perf_counter()
+                    print(chunk, end="", flush=True)
+                    render += time.perf_counter() - start
+                    reply.append(chunk)
+                print()
+                turn.record("render", render)
+                if store:
+                    store.add(session, "user", user_input)
+                    reply = "".join(reply).strip()
+                    if not reply.startswith("⚠"):
+                        store.add(session, "assistant", reply)
 
     except KeyboardInterrupt:
         print("\n👋 KeyboardInterrupt received. Exiting YashBot.")
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for OpenRouter's /api/v1/chat/completions endpoint.
+
+Point YashBot at it with:
+    OPENROUTER_BASE_URL=http://127.0.0.1:8765/api/v1 OPENROUTER_API_KEY=test python main.py
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class MockOpenRouterHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/api/v1/chat/completions":
+            return self.send_json(404, {"error": {"message": "not found"}})
+
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        request = json.loads(body or b"{}")
+        self.server.request_count += 1
+
+        limits = self.server.take_rate_limit()
+        if limits and limits["x-ratelimit-remaining"] < 0:
+            self.server.rejected_count += 1
+            limits["x-ratelimit-remaining"] = 0
+            return self.send_json(429, {"error": {"message": "mock rate limit exceeded"}},
+                                  {**limits, "Retry-After": max(1, round(limits["x-ratelimit-reset"] / 1000 - time.time()))})
+
+        time.sleep(self.server.latency)
+        if random.random() < self.server.error_rate:
+            return self.send_json(503, {"error": {"message": "mock upstream error"}})
+
+        reply = self.server.reply_for(request)
+        if request.get("stream"):
+            self.send_stream(request, reply, limits)
+        else:
+            words = reply.split(" ")
+            if self.server.token_rate:
+                time.sleep(len(words) / self.server.token_rate)
+            self.send_json(200, {
+                "id": "mock",
+                "model": request.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply},
+                             "finish_reason": "stop"}],
+                "usage": {"completion_tokens": len(words)},
+            }, limits)
+
+    def send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_stream(self, request, reply, headers=None):
+        # Chunked transfer encoding, like the real API: each event is
+        # delivered as soon as it is written and the connection stays open
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.write_chunk(b": OPENROUTER PROCESSING\n\n")
+        for i, word in enumerate(reply.split(" ")):
+            # Each word is one "token"; the first one goes out right away
+            if i and self.server.token_rate:
+                time.sleep(1 / self.server.token_rate)
+            chunk = {"choices": [{"index": 0, "delta": {"content": word + " "}}]}
+            self.write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+        self.write_chunk(b"data: [DONE]\n\n")
+        self.write_chunk(b"")
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+class MockOpenRouter(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, error_rate=0.0,
+                 token_rate=0.0, reply_tokens=None, rate_limit=0, verbose=False):
+        super().__init__((host, port), MockOpenRouterHandler)
+        self.latency = latency              # seconds before the first token
+        self.error_rate = error_rate
+        self.token_rate = token_rate        # tokens per second after that (0 = unlimited)
+        self.reply_tokens = reply_tokens    # pad/trim replies to this many tokens
+        self.rate_limit = rate_limit        # requests per minute, like the free tier (0 = unlimited)
+        self.verbose = verbose
+        self.request_count = 0
+        self.rejected_count = 0
+        self._window = (0.0, 0)             # (start, requests) of the current minute
+        self._window_lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        # Clients that hang up mid-response (killed runs, cancelled streams) are expected
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+    def take_rate_limit(self):
+        """Count a request against the fixed one-minute window; returns the x-ratelimit-* headers."""
+        if not self.rate_limit:
+            return {}
+        with self._window_lock:
+            now = time.time()
+            start, count = self._window
+            if now - start >= 60:
+                start, count = now, 0
+            count += 1
+            self._window = (start, count)
+        return {"x-ratelimit-limit": self.rate_limit,
+                "x-ratelimit-remaining": self.rate_limit - count,
+                "x-ratelimit-reset": int((start + 60) * 1000)}
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api/v1"
+
+    def reply_for(self, request):
+        prompt = request.get("messages", [{}])[-1].get("content", "")
+        reply = f"Mock reply to: {prompt}"
+        if self.reply_tokens:
+            words = reply.split(" ")[:self.reply_tokens]
+            words += ["token"] * (self.reply_tokens - len(words))
+            reply = " ".join(words)
+        return reply
+
+    def start(self):
+        """Serve from a background thread (handy in scripts and benchmarks)."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before each response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--token-rate", type=float, default=0.0, help="tokens per second (0 = as fast as possible)")
+    parser.add_argument("--reply-tokens", type=int, help="make every reply this many tokens long")
+    parser.add_argument("--rate-limit", type=int, default=0, help="requests per minute before answering 429")
+    args = parser.parse_args()
+    server = MockOpenRouter(port=args.port, latency=args.latency, error_rate=args.error_rate,
+                            token_rate=args.token_rate, reply_tokens=args.reply_tokens,
+                            rate_limit=args.rate_limit, verbose=True)
+    print(f"Mock OpenRouter listening on {server.base_url}")
+    server.serve_forever()
@@ -0,0 +1,172 @@
+# models/autotune.py
+
+import json
+import os
+import socket
+import time
+
+from models.gguf import trained_context
+from models.llm_interface import estimate_tokens
+
+PROFILE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "yashbot", "autotune.json")
+
+# A fixed workload, so runs are comparable: a quick question, a typical
+# one and one with a paragraph of context to prefill
+PROMPTS = (
+    "What is the capital of France?",
+    "Explain in two sentences why the sky is blue.",
+    "Summarize this in one sentence: A write-ahead log records every change before it is "
+    "applied to the database file. After a crash, replaying the log restores the changes that "
+    "had been committed, and anything half-written is discarded, so the file is never left in "
+    "an inconsistent state. Checkpoints copy the logged pages back into the database so the "
+    "log does not grow forever.",
+)
+
+BATCH_SIZES = (8, 32, 128, 512)
+CONTEXT_SIZES = (2048, 4096, 8192)
+
+# Profiles are compared on the time of a representative chat turn
+TURN_PROMPT_TOKENS = 300
+TURN_REPLY_TOKENS = 60
+
+# A larger context costs RAM (its KV cache) and is only taken if it makes
+# the turn at least this much faster
+MIN_CONTEXT_GAIN = 0.05
+
+def host_id():
+    return socket.gethostname()
+
+def _key(model_path):
+    return f"{host_id()}:{os.path.realpath(os.path.expanduser(model_path))}"
+
+def _path():
+    return os.path.expanduser(os.getenv("YASHBOT_AUTOTUNE_PATH", PROFILE_PATH))
+
+def load_profiles():
+    try:
+        with open(_path(), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def load_profile(model_path):
+    """The saved profile for this host and model file, or None (also with YASHBOT_AUTOTUNE=0)."""
+    if os.getenv("YASHBOT_AUTOTUNE", "1") == "0":
+        return None
+    return load_profiles().get(_key(model_path))
+
+def save_profile(model_path, profile):
+    path = _path()
+    profiles = load_profiles()
+    profiles[_key(model_path)] = profile
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(profiles, f, indent=2)
+    os.replace(tmp, path)
+
+def tuned_settings(model_path):
+    """The n_threads / n_batch / n_ctx of the saved profile ({} if none)."""
+    profile = load_profile(model_path) or {}
+    return {k: profile[k] for k in ("n_threads", "n_batch", "n_ctx") if k in profile}
+
+def thread_counts():
+    """Thread counts worth trying: around the number of physical cores, and all logical ones."""
+    logical = os.cpu_count() or 1
+    try:
+        import psutil
+        physical = psutil.cpu_count(logical=False) or logical
+    except ImportError:
+        physical = logical
+    return sorted({max(1, physical // 2), max(1, physical - 1), physical, logical})
+
+def turn_seconds(prefill_tps, decode_tps):
+    return TURN_PROMPT_TOKENS / prefill_tps + TURN_REPLY_TOKENS / decode_tps
+
+def _load(path, n_threads, n_ctx):
+    from gpt4all import GPT4All
+    return GPT4All(model_name=path, n_threads=n_threads, n_ctx=n_ctx)
+
+def measure(model, n_batch, prompts=PROMPTS, max_tokens=48):
+    """
+    Run the prompts and return (prefill, decode) rates in tokens/s. Prefill
+    is the time to the first token; decode covers the tokens after it.
+    """
+    prefill_tokens = prefill_time = decode_tokens = decode_time = 0.0
+    for prompt in prompts:
+        times = []
+        start = time.perf_counter()
+        with model.chat_session():
+            model.generate(prompt, max_tokens=max_tokens, temp=0.0, n_batch=n_batch,
+                           callback=lambda token_id, text: times.append(time.perf_counter()) or True)
+        if not times:
+            continue
+        prefill_tokens += estimate_tokens(prompt)
+        prefill_time += times[0] - start
+        decode_tokens += len(times) - 1
+        decode_time += times[-1] - times[0]
+    return (prefill_tokens / max(prefill_time, 1e-9), decode_tokens / max(decode_time, 1e-9))
+
+def autotune(spec, threads=None, batches=BATCH_SIZES, contexts=CONTEXT_SIZES,
+             prompts=PROMPTS, loader=_load, log=print, save=True):
+    """
+    Find fast n_threads / n_batch / n_ctx settings for a model on this
+    machine and save them (see load_profile()). Each setting is swept in
+    turn with the best values found so far, which needs far fewer model
+    loads than trying every combination: threads first (a load each), then
+    the prompt batch size (no reload), then larger context sizes up to the
+    one the model was trained with. spec.n_ctx is kept unless a larger one
+    is measurably faster.
+    """
+    trials = []
+    models = {}
+
+    def model_for(n_threads, n_ctx):
+        if (n_threads, n_ctx) not in models:
+            for old in models.values():
+                old.close()
+            models.clear()
+            models[n_threads, n_ctx] = loader(spec.path, n_threads, n_ctx)
+            measure(models[n_threads, n_ctx], 8, prompts[:1], max_tokens=4)   # warm-up
+        return models[n_threads, n_ctx]
+
+    def trial(n_threads, n_batch, n_ctx):
+        try:
+            prefill, decode = measure(model_for(n_threads, n_ctx), n_batch, prompts)
+        except Exception as e:
+            log(f"   threads={n_threads:<3} batch={n_batch:<4} ctx={n_ctx:<5} failed: {e}")
+            return None
+        result = {"n_threads": n_threads, "n_batch": n_batch, "n_ctx": n_ctx,
+                  "prefill_tps": round(prefill, 1), "decode_tps": round(decode, 2),
+                  "turn_s": round(turn_seconds(prefill, decode), 3)}
+        trials.append(result)
+        log(f"   threads={n_threads:<3} batch={n_batch:<4} ctx={n_ctx:<5} "
+            f"prefill {prefill:7.1f} tok/s  decode {decode:6.2f} tok/s  turn {result['turn_s']:.2f}s")
+        return result
+
+    def fastest(results):
+        results = [r for r in results if r]
+        if not results:
+            raise RuntimeError(f"autotune: every run of {spec.path} failed")
+        return min(results, key=lambda r: r["turn_s"])
+
+    trained = trained_context(spec.path)
+    n_ctx = min(spec.n_ctx, trained) if trained else spec.n_ctx
+    try:
+        log(f"🔧 Tuning {spec.name} on {host_id()}")
+        best = fastest([trial(t, 128, n_ctx) for t in threads or thread_counts()])
+        best = fastest([best] + [trial(best["n_threads"], b, n_ctx)
+                                 for b in batches if b != best["n_batch"]])
+        larger = [trial(best["n_threads"], best["n_batch"], c) for c in contexts
+                  if c > n_ctx and (trained is None or c <= trained)]
+        limit = best["turn_s"] * (1 - MIN_CONTEXT_GAIN)
+        best = fastest([best] + [r for r in larger if r and r["turn_s"] <= limit])
+    finally:
+        for model in models.values():
+            model.close()
+
+    profile = {**{k: best[k] for k in ("n_threads", "n_batch", "n_ctx", "prefill_tps", "decode_tps")},
+               "host": host_id(), "model": spec.path, "tuned": time.time(), "trials": trials}
+    if save:
+        save_profile(spec.path, profile)
+    return profile
@@ -0,0 +1,78 @@
+# models/gguf.py
+
+import functools
+import os
+import struct
+
+# Value types of GGUF metadata: struct format per fixed-size type
+_SCALARS = {0: "B", 1: "b", 2: "H", 3: "h", 4: "I", 5: "i", 6: "f", 7: "?", 10: "Q", 11: "q", 12: "d"}
+_STRING, _ARRAY = 8, 9
+
+class _Reader:
+    def __init__(self, f):
+        self.f = f
+
+    def unpack(self, fmt):
+        fmt = "<" + fmt
+        return struct.unpack(fmt, self.f.read(struct.calcsize(fmt)))[0]
+
+    def string(self):
+        return self.f.read(self.unpack("Q")).decode("utf-8", errors="replace")
+
+    def value(self, kind):
+        if kind in _SCALARS:
+            return self.unpack(_SCALARS[kind])
+        if kind == _STRING:
+            return self.string()
+        if kind == _ARRAY:
+            item_kind, count = self.unpack("I"), self.unpack("Q")
+            if item_kind in _SCALARS:
+                # Only skipped: the big arrays are the tokenizer's
+                self.f.seek(count * struct.calcsize(_SCALARS[item_kind]), os.SEEK_CUR)
+            else:
+                for _ in range(count):
+                    self.value(item_kind)
+            return None
+        raise ValueError(f"unknown GGUF value type {kind}")
+
+@functools.lru_cache(maxsize=32)
+def _read(path, mtime):
+    with open(path, "rb") as f:
+        r = _Reader(f)
+        if f.read(4) != b"GGUF":
+            raise ValueError(f"{path} is not a GGUF file")
+        version = r.unpack("I")
+        count = "I" if version == 1 else "Q"
+        r.unpack(count)     # tensor count
+        metadata = {}
+        for _ in range(r.unpack(count)):
+            key = r.string()
+            metadata[key] = r.value(r.unpack("I"))
+        return metadata
+
+def metadata(path):
+    """The scalar metadata of a GGUF file (arrays are None), or {} if it can't be read."""
+    try:
+        return _read(path, os.path.getmtime(path))
+    except (OSError, ValueError, struct.error):
+        return {}
+
+def _arch_value(meta, key):
+    return meta.get(f"{meta.get('general.architecture')}.{key}")
+
+def trained_context(path):
+    """The context length the model was trained with, or None if unknown."""
+    return _arch_value(metadata(path), "context_length")
+
+def kv_cache_bytes(path, n_ctx):
+    """
+    Size of the f16 KV cache for n_ctx tokens: a key and a value vector per
+    layer and token (smaller with grouped-query attention). None if unknown.
+    """
+    meta = metadata(path)
+    layers, width, heads = (_arch_value(meta, k) for k in
+                            ("block_count", "embedding_length", "attention.head_count"))
+    if not (layers and width and heads):
+        return None
+    kv_heads = _arch_value(meta, "attention.head_count_kv") or heads
+    return 2 * layers * n_ctx * (width * kv_heads // heads) * 2
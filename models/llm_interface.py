@@ -1,10 +1,326 @@
-from gpt4all import GPT4All
+import contextlib
+import os
+import queue
+import threading
 
 MODEL_PATH = "/home/yashu278/gpt4all/models/qwen2-1_5b-instruct-q4_0.gguf"
+N_CTX = 2048
 
-model = GPT4All(model_name=MODEL_PATH)
+# Rough characters-per-token ratio, used to decide when a session is full
+CHARS_PER_TOKEN = 4
 
-def ask_bot(prompt):
-    with model.chat_session():
-        return model.generate(prompt, max_tokens=500)
+# The GPT4All model is loaded on first use (or by warm_up()), so importing
+# this module is cheap and online-only users never pay for the gguf load.
+model = None
+_model_lock = threading.Lock()
+_warm_thread = None
+
+_DONE = object()
+
+# Only one chat session can own the model's context at a time
+_generate_lock = threading.RLock()
+_active_session = None
+
+def get_model():
+    """The active model (see models/model_manager.py), loaded on first use."""
+    global model
+    if model is None:
+        with _model_lock:
+            if model is None:
+                from models.model_manager import get_manager
+                model = get_manager().get()
+    return model
+
+def use_model(name):
+    """
+    Make a registered model the active one. It is loaded first (unless the
+    manager still has it), so the current model keeps answering until the
+    swap; a generation in progress finishes before it.
+    """
+    global model, _pool
+    from models.model_manager import get_manager
+    manager = get_manager()
+    new = manager.get(name)
+    with _generate_lock:
+        if new is model:
+            return
+        if _active_session is not None:
+            _active_session.close()
+        old_path = manager.activate(name).path
+        model = new
+    with _pool_lock:
+        # Worker processes load the active model's file; restart them on demand
+        if _pool is not None and manager.spec().path != old_path:
+            _pool.close()
+            _pool = None
+
+def switch_model(name):
+    """use_model() in a background thread; returns the thread."""
+    from models.model_manager import get_manager
+    get_manager().spec(name)  # unknown names fail here, not in the thread
+    thread = threading.Thread(target=use_model, args=(name,), name="yashbot-switch", daemon=True)
+    thread.start()
+    return thread
+
+def _warm():
+    # Errors are raised again (and reported) on the first real ask_bot call
+    try:
+        get_model()
+    except Exception:
+        pass
+
+def warm_up():
+    """Start loading the model in a background thread and return the thread."""
+    global _warm_thread
+    with _model_lock:
+        if _warm_thread is None:
+            _warm_thread = threading.Thread(target=_warm, name="yashbot-warmup", daemon=True)
+            _warm_thread.start()
+    return _warm_thread
+
+def is_loaded():
+    return model is not None
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def ingest_prefix(model, n_batch=8):
+    """
+    Evaluate the system prompt of the model's open chat session now, the
+    way GPT4All does on a session's first turn, and return the context
+    position where it ends. Returns None for models that can't be rewound
+    (anything without GPT4All's prompt_model, such as a stand-in).
+    """
+    llm = getattr(model, "model", None)
+    if not hasattr(llm, "prompt_model"):
+        return None
+    llm.prompt_model(model._history[0]["content"], "%1", lambda token_id, text: True,
+                     n_predict=0, n_batch=n_batch, special=True, reset_context=True)
+    # A session with more than the system message doesn't re-ingest it
+    model._history.append({"role": "user", "content": ""})
+    return llm.context.n_past
+
+def rewind(model, position):
+    """
+    Forget everything after `position` in the open chat session. This is
+    what reset_context does with position 0: the next prompt is evaluated
+    from there and overwrites the old tokens in the KV cache.
+    """
+    model.model.context.n_past = position
+    del model._history[2:]
+
+class ChatSession:
+    """
+    A long-lived GPT4All chat session. The system prompt and previous turns
+    stay evaluated in the model's KV cache, so each turn only has to prefill
+    the new user message. The session resets itself when the context window
+    would overflow.
+    """
+
+    def __init__(self, system_prompt=None, n_ctx=N_CTX, n_batch=8):
+        self.system_prompt = system_prompt
+        self.n_ctx = n_ctx
+        self.n_batch = n_batch
+        self.turns = 0
+        self._stack = None
+        self._model = None
+
+    @property
+    def is_open(self):
+        return self._stack is not None
+
+    def _open(self):
+        global _active_session
+        if _active_session is not None and _active_session is not self:
+            _active_session.close()
+        from models.model_manager import get_manager
+        self._model = get_model()
+        # The model's own (possibly autotuned) context and batch sizes
+        spec = get_manager().spec()
+        self.n_ctx, self.n_batch = spec.n_ctx, spec.n_batch
+        self._stack = contextlib.ExitStack()
+        self._stack.enter_context(self._model.chat_session(self.system_prompt))
+        self.turns = 0
+        _active_session = self
+
+    def close(self):
+        global _active_session
+        with _generate_lock:
+            if self._stack is not None:
+                self._stack.close()
+                self._stack = None
+            if _active_session is self:
+                _active_session = None
+
+    def reset(self, system_prompt=None):
+        """Drop all previous turns (and optionally change the system prompt)."""
+        with _generate_lock:
+            self.close()
+            if system_prompt is not None:
+                self.system_prompt = system_prompt
+
+    def _start_turn(self):
+        pass
+
+    def context_used(self):
+        """Number of tokens currently held in the model's context."""
+        if not self.is_open:
+            return 0
+        context = self._model.model.context
+        if context is None:
+            return estimate_tokens(self.system_prompt or "")
+        return context.n_past
 
+    def fits(self, prompt, max_tokens):
+        """Whether another turn of this size fits in the open context."""
+        return self.context_used() + estimate_tokens(prompt) + max_tokens < self.n_ctx
+
+    def ask(self, prompt, max_tokens=500, **kwargs):
+        return "".join(self.ask_stream(prompt, max_tokens=max_tokens, **kwargs))
+
+    def ask_stream(self, prompt, max_tokens=500, **kwargs):
+        """
+        Yield the response as the model produces it. Closing the generator
+        early stops generation at the next token.
+        """
+        with _generate_lock:
+            if self.is_open and not self.fits(prompt, max_tokens):
+                self.close()
+            if not self.is_open:
+                self._open()
+            self._start_turn()
+
+            chunks = queue.Queue()
+            cancelled = threading.Event()
+
+            def on_token(token_id, text):
+                if cancelled.is_set():
+                    return False
+                chunks.put(text)
+                return True
+
+            def run():
+                try:
+                    self._model.generate(prompt, max_tokens=max_tokens, callback=on_token,
+                                         **{"n_batch": self.n_batch, **kwargs})
+                except Exception as e:
+                    chunks.put(e)
+                finally:
+                    chunks.put(_DONE)
+
+            worker = threading.Thread(target=run, name="yashbot-generate", daemon=True)
+            worker.start()
+            try:
+                while True:
+                    item = chunks.get()
+                    if item is _DONE:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item
+            finally:
+                cancelled.set()
+                worker.join()
+                self.turns += 1
+
+class PrefixSession(ChatSession):
+    """
+    A session for one-shot generations that share a system prompt. The
+    system prompt is evaluated once; before each request the context is
+    rewound to just after it, so a request only prefills its own message
+    and never sees an earlier request's turn.
+    """
+
+    def _open(self):
+        super()._open()
+        self._prefix = ingest_prefix(self._model, self.n_batch)
+
+    def _start_turn(self):
+        if not self.turns:
+            return
+        if self._prefix is None:
+            # This model can't be rewound: start from a clean session
+            self.close()
+            self._open()
+        else:
+            rewind(self._model, self._prefix)
+
+    def context_used(self):
+        if self.is_open and self._prefix is not None:
+            return self._prefix
+        return 0
+
+_session = None
+_prefix_session = None
+
+def get_session(system_prompt=""):
+    """Return the shared session, resetting it if the system prompt changed."""
+    global _session
+    with _generate_lock:
+        if _session is None:
+            _session = ChatSession(system_prompt)
+        elif _session.system_prompt != system_prompt:
+            _session.reset(system_prompt)
+        return _session
+
+def reset_session():
+    with _generate_lock:
+        if _session is not None:
+            _session.reset()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def start_pool(n_workers=None, n_threads=None):
+    """
+    Serve one-shot generations from a pool of model worker processes.
+    Defaults come from YASHBOT_OFFLINE_WORKERS / YASHBOT_WORKER_THREADS.
+    """
+    global _pool
+    from models.worker_pool import ModelWorkerPool
+    with _pool_lock:
+        if _pool is None:
+            n_workers = n_workers or int(os.getenv("YASHBOT_OFFLINE_WORKERS", "2"))
+            n_threads = n_threads or int(os.getenv("YASHBOT_WORKER_THREADS", "0")) or None
+            from models.model_manager import get_manager
+            spec = get_manager().spec()
+            if n_threads is None and spec.n_threads:
+                # The autotuned thread count is for one process; share it out
+                n_threads = max(1, spec.n_threads // n_workers)
+            _pool = ModelWorkerPool(spec.path, n_workers=n_workers, n_threads=n_threads, n_ctx=spec.n_ctx)
+        return _pool
+
+def get_pool():
+    """The worker pool, started on demand when YASHBOT_OFFLINE_WORKERS > 0."""
+    if _pool is None and int(os.getenv("YASHBOT_OFFLINE_WORKERS", "0")) > 0:
+        start_pool()
+    return _pool
+
+def stream_once(prompt, system_prompt=None, max_tokens=500, stop=None, **kwargs):
+    """
+    One-shot, stateless generation, yielded token by token. Runs on the
+    worker pool when one is enabled (tokens arrive once the worker is done;
+    `stop` strings end generation early there), otherwise on the in-process
+    model, taking it away from any open session (see PrefixSession).
+    """
+    pool = get_pool()
+    if pool is not None:
+        from models.model_manager import get_manager
+        kwargs.setdefault("n_batch", get_manager().spec().n_batch)
+        yield from pool.submit(prompt, system_prompt, max_tokens=max_tokens, stop=stop, **kwargs).result()
+        return
+    global _prefix_session
+    with _generate_lock:
+        # Consecutive one-shot requests with the same system prompt (the
+        # server's and batch jobs') share its evaluation
+        if _prefix_session is None:
+            _prefix_session = PrefixSession(system_prompt)
+        elif _prefix_session.system_prompt != system_prompt:
+            _prefix_session.reset(system_prompt)
+        yield from _prefix_session.ask_stream(prompt, max_tokens=max_tokens, **kwargs)
+
+def ask_once(prompt, system_prompt=None, max_tokens=500, **kwargs):
+    return "".join(stream_once(prompt, system_prompt, max_tokens=max_tokens, **kwargs))
+
+def ask_bot(prompt):
+    return ask_once(prompt, max_tokens=500)
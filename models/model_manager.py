@@ -0,0 +1,243 @@
+# models/model_manager.py
+
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from models.autotune import tuned_settings
+from models.gguf import kv_cache_bytes
+from models.llm_interface import MODEL_PATH, N_CTX, estimate_tokens
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config", "models.json")
+
+# Questions that read like more than a quick lookup go to the larger model
+_HARD = re.compile(r"\b(why|how|explain|compare|write|code|analy[sz]e|steps?|prove|design|summari[sz]e)\b", re.I)
+
+@dataclass
+class ModelSpec:
+    name: str
+    path: str
+    n_ctx: int = N_CTX
+    n_threads: int = None   # None: GPT4All's default
+    n_batch: int = 8
+
+    @property
+    def ram_bytes(self):
+        """Rough resident size once loaded: the weights, the KV cache for n_ctx and some headroom."""
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return 0
+        kv_cache = kv_cache_bytes(self.path, self.n_ctx)
+        if kv_cache is None:
+            return int(size * 1.2)
+        return int(size * 1.1) + kv_cache
+
+def _stem(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+def load_registry(config_path=None, models_dir=None):
+    """
+    Returns (name -> ModelSpec, config). Every *.gguf in models_dir is
+    registered under its file name; entries in the JSON config's "models"
+    section are added on top (and win on name clashes). The config may also
+    name a "default" model and a "routing" section.
+
+    Settings saved by the autotuner for this host are applied to each
+    model; n_ctx / n_threads / n_batch in its config entry take precedence.
+    """
+    specs = {_stem(MODEL_PATH): ModelSpec(_stem(MODEL_PATH), MODEL_PATH, **tuned_settings(MODEL_PATH))}
+    models_dir = os.path.expanduser(models_dir or os.getenv("YASHBOT_MODELS_DIR", os.path.dirname(MODEL_PATH)))
+    if os.path.isdir(models_dir):
+        for entry in sorted(os.listdir(models_dir)):
+            if entry.endswith(".gguf"):
+                path = os.path.join(models_dir, entry)
+                specs[_stem(path)] = ModelSpec(_stem(path), path, **tuned_settings(path))
+
+    config = {}
+    config_path = os.path.expanduser(config_path or os.getenv("YASHBOT_MODELS_CONFIG", CONFIG_PATH))
+    if os.path.exists(config_path):
+        with open(config_path, encoding="utf-8") as f:
+            config = json.load(f)
+        for name, entry in config.get("models", {}).items():
+            if isinstance(entry, str):
+                entry = {"path": entry}
+            path = os.path.expanduser(entry["path"])
+            settings = {**tuned_settings(path), **{k: entry[k] for k in ("n_ctx", "n_threads", "n_batch") if k in entry}}
+            specs[name] = ModelSpec(name, path, **settings)
+    return specs, config
+
+def _load_gpt4all(spec):
+    from gpt4all import GPT4All
+    return GPT4All(model_name=spec.path, n_threads=spec.n_threads, n_ctx=spec.n_ctx)
+
+def default_ram_budget():
+    """YASHBOT_MODEL_RAM_MB, else half the machine's memory."""
+    mb = os.getenv("YASHBOT_MODEL_RAM_MB")
+    if mb:
+        return int(mb) * 2**20
+    try:
+        import psutil
+        return psutil.virtual_memory().total // 2
+    except ImportError:
+        return 4 * 2**30
+
+class ModelManager:
+    """
+    Loads registered models on demand and keeps as many loaded as fit in
+    ram_budget bytes, evicting the least recently used one (never the
+    active one) to make room. Switching back to a model that is still
+    loaded costs nothing; preload() loads one in the background ahead of
+    time.
+
+    With routing {"short": name, "long": name}, route() sends short,
+    simple questions to the first and everything else to the second.
+    """
+
+    def __init__(self, specs, default, ram_budget, routing=None, loader=_load_gpt4all):
+        if default not in specs:
+            raise ValueError(f"Unknown model: {default}")
+        self.specs = specs
+        self.active = default
+        self.ram_budget = ram_budget
+        self.routing = routing or {}
+        self.loader = loader
+        self.loads = 0
+        self.evictions = 0
+        self._loaded = OrderedDict()   # name -> model, least recently used first
+        self._loading = {}             # name -> Event set when its load ends
+        self._lock = threading.Lock()
+
+    def spec(self, name=None):
+        name = name or self.active
+        if name not in self.specs:
+            raise ValueError(f"Unknown model: {name}")
+        return self.specs[name]
+
+    def activate(self, name):
+        """Make a registered model the active one (never evicted); returns the previous one's spec."""
+        spec = self.spec(name)
+        with self._lock:
+            previous = self.specs[self.active]
+            self.active = spec.name
+        return previous
+
+    def is_loaded(self, name=None):
+        return (name or self.active) in self._loaded
+
+    def _used(self):
+        return sum(self.specs[name].ram_bytes for name in self._loaded)
+
+    def fits(self, name):
+        """Whether the model can be loaded without evicting the active one."""
+        with self._lock:
+            active = self.specs[self.active].ram_bytes if self.active in self._loaded else 0
+        return active + self.spec(name).ram_bytes <= self.ram_budget
+
+    def _make_room(self, spec):
+        evicted = []
+        with self._lock:
+            used = self._used()
+            for name in list(self._loaded):
+                if used + spec.ram_bytes <= self.ram_budget:
+                    break
+                if name in (self.active, spec.name):
+                    continue
+                evicted.append(self._loaded.pop(name))
+                used -= self.specs[name].ram_bytes
+                self.evictions += 1
+        for model in evicted:
+            if hasattr(model, "close"):
+                model.close()
+
+    def get(self, name=None):
+        """The loaded model, loading it (and evicting others to make room) if needed."""
+        spec = self.spec(name)
+        while True:
+            with self._lock:
+                if spec.name in self._loaded:
+                    self._loaded.move_to_end(spec.name)
+                    return self._loaded[spec.name]
+                loading = self._loading.get(spec.name)
+                if loading is None:
+                    loading = self._loading[spec.name] = threading.Event()
+                    break
+            # Another thread is loading it; use theirs (or retry if it failed)
+            loading.wait()
+
+        try:
+            self._make_room(spec)
+            model = self.loader(spec)
+            with self._lock:
+                self._loaded[spec.name] = model
+                self.loads += 1
+            return model
+        finally:
+            with self._lock:
+                del self._loading[spec.name]
+            loading.set()
+
+    def preload(self, name):
+        """Start loading a model in the background if it fits the budget; returns the thread or None."""
+        if self.is_loaded(name) or name in self._loading or not self.fits(name):
+            return None
+        thread = threading.Thread(target=self._preload, args=(name,), name="yashbot-preload", daemon=True)
+        thread.start()
+        return thread
+
+    def _preload(self, name):
+        # Errors are raised again when the model is actually used
+        try:
+            self.get(name)
+        except Exception:
+            pass
+
+    def route(self, prompt):
+        """The model for this prompt, or None without routing. Preloads the other one."""
+        short, long = self.routing.get("short"), self.routing.get("long")
+        if not short or not long:
+            return None
+        simple = estimate_tokens(prompt) <= self.routing.get("short_tokens", 24) and not _HARD.search(prompt)
+        name, other = (short, long) if simple else (long, short)
+        self.preload(other)
+        return name
+
+    def cache_key(self):
+        """What identifies the model(s) answering, for the response cache."""
+        if self.routing.get("short") and self.routing.get("long"):
+            return f"route:{self.routing['short']},{self.routing['long']}"
+        return self.spec().path
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active": self.active,
+                "loaded": list(self._loaded),
+                "ram_used_mb": round(self._used() / 2**20),
+                "ram_budget_mb": round(self.ram_budget / 2**20),
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+_manager = None
+_manager_lock = threading.Lock()
+
+def get_manager():
+    """
+    The shared model manager. The default model is YASHBOT_MODEL, else the
+    config's "default", else the built-in MODEL_PATH; YASHBOT_MODEL_SHORT and
+    YASHBOT_MODEL_LONG override the config's routing.
+    """
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            specs, config = load_registry()
+            default = os.getenv("YASHBOT_MODEL") or config.get("default") or _stem(MODEL_PATH)
+            routing = dict(config.get("routing", {}))
+            for key in ("short", "long"):
+                routing[key] = os.getenv(f"YASHBOT_MODEL_{key.upper()}", routing.get(key))
+            _manager = ModelManager(specs, default, default_ram_budget(), routing)
+        return _manager
@@ -0,0 +1,255 @@
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# Worker processes are started with "spawn" so they don't inherit the
+# parent's threads (Qt, HTTP pools, a half-loaded model...).
+_mp = multiprocessing.get_context("spawn")
+
+def _worker_main(worker_id, model_path, n_threads, n_ctx, tasks, results):
+    """
+    Worker process: load a private GPT4All instance and answer tasks until
+    told to stop. llama.cpp mmaps the gguf read-only, so the weights live in
+    the shared page cache and N workers cost roughly one copy of the file
+    plus N KV caches.
+    """
+    import contextlib
+    from gpt4all import GPT4All
+    from models.llm_interface import ingest_prefix, rewind
+    model = GPT4All(model_name=model_path, n_threads=n_threads, n_ctx=n_ctx)
+    results.put(("ready", worker_id, None, None))
+
+    # The chat session stays open while tasks keep the same system prompt,
+    # which is then evaluated once and rewound to between tasks
+    session = contextlib.ExitStack()
+    current = prefix = None
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_id, system_prompt, prompt, kwargs = task
+        if system_prompt != current or prefix is None:
+            session.close()
+            session.enter_context(model.chat_session(system_prompt))
+            current, prefix = system_prompt, ingest_prefix(model, kwargs.get("n_batch", 8))
+        else:
+            rewind(model, prefix)
+        stop = kwargs.pop("stop", None) or ()
+        chunks = []
+        text = ""
+
+        def collect(token_id, token):
+            # Stop strings end generation right here instead of after max_tokens
+            nonlocal text
+            chunks.append(token)
+            text += token
+            window = text[-(max(map(len, stop), default=0) + len(token)):]
+            return not any(s in window for s in stop)
+
+        try:
+            model.generate(prompt, callback=collect, **kwargs)
+            results.put(("done", worker_id, task_id, chunks))
+        except Exception as e:
+            results.put(("error", worker_id, task_id, f"{type(e).__name__}: {e}"))
+
+class WorkerCrashed(RuntimeError):
+    pass
+
+class ModelWorkerPool:
+    """
+    A pool of GPT4All worker processes behind one request queue, so several
+    offline generations can run on different cores at once.
+
+    A dispatcher thread hands each queued request to an idle worker, so the
+    pool always knows which request every worker holds. A monitor thread
+    restarts workers that die, and kills and restarts any worker stuck on
+    one request for longer than request_timeout. The request that worker was
+    handling fails with WorkerCrashed instead of being retried, so a prompt
+    that crashes the model can't take the pool down in a loop.
+    """
+
+    def __init__(self, model_path, n_workers=2, n_threads=None, n_ctx=2048,
+                 request_timeout=300.0, check_interval=1.0):
+        self.model_path = model_path
+        self.n_workers = n_workers
+        self.n_threads = n_threads or max(1, (os.cpu_count() or 1) // n_workers)
+        self.n_ctx = n_ctx
+        self.request_timeout = request_timeout
+        self.check_interval = check_interval
+
+        self._queue = queue.Queue()
+        self._results = _mp.Queue()
+        self._futures = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._idle_changed = threading.Condition(self._lock)
+        self._workers = {}      # worker_id -> (process, task queue)
+        self._idle = set()
+        self._ready = set()
+        self._current = {}      # worker_id -> (task_id, started_at)
+        self._closed = False
+        self._failed_starts = 0
+
+        self.restarts = 0
+        self.tokens = 0
+        self.completed = 0
+        self._started_at = time.perf_counter()
+
+        for worker_id in range(n_workers):
+            self._spawn(worker_id)
+        for target, name in ((self._dispatch, "dispatch"), (self._collect, "results"), (self._monitor, "monitor")):
+            threading.Thread(target=target, name=f"yashbot-pool-{name}", daemon=True).start()
+
+    def _spawn(self, worker_id):
+        tasks = _mp.Queue()
+        process = _mp.Process(
+            target=_worker_main,
+            args=(worker_id, self.model_path, self.n_threads, self.n_ctx, tasks, self._results),
+            name=f"yashbot-model-{worker_id}",
+            daemon=True,
+        )
+        process.start()
+        self._workers[worker_id] = (process, tasks)
+
+    def submit(self, prompt, system_prompt=None, **kwargs):
+        """
+        Queue a one-shot generation and return a Future for the list of
+        generated tokens. A `stop` list of strings ends generation early.
+        """
+        future = Future()
+        task_id = next(self._ids)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("worker pool is closed")
+            self._futures[task_id] = future
+        self._queue.put((task_id, system_prompt, prompt, kwargs))
+        return future
+
+    def ask(self, prompt, system_prompt=None, **kwargs):
+        return "".join(self.submit(prompt, system_prompt, **kwargs).result())
+
+    def _dispatch(self):
+        while True:
+            task = self._queue.get()
+            if task is None:
+                return
+            with self._idle_changed:
+                while not self._idle and not self._closed:
+                    self._idle_changed.wait()
+                if self._closed:
+                    return
+                if task[0] not in self._futures:
+                    continue  # already failed (pool gave up)
+                worker_id = self._idle.pop()
+                self._current[worker_id] = (task[0], time.monotonic())
+                self._workers[worker_id][1].put(task)
+
+    def _collect(self):
+        while True:
+            try:
+                kind, worker_id, task_id, payload = self._results.get()
+            except (EOFError, OSError):
+                return
+            with self._idle_changed:
+                if kind == "ready":
+                    self._ready.add(worker_id)
+                    self._failed_starts = 0
+                else:
+                    self._current.pop(worker_id, None)
+                self._idle.add(worker_id)
+                self._idle_changed.notify()
+                if kind == "ready":
+                    continue
+                future = self._futures.pop(task_id, None)
+                if kind == "done":
+                    self.tokens += len(payload)
+                    self.completed += 1
+            if future is None:
+                continue
+            if kind == "done":
+                future.set_result(payload)
+            else:
+                future.set_exception(RuntimeError(payload))
+
+    def _monitor(self):
+        while not self._closed:
+            time.sleep(self.check_interval)
+            now = time.monotonic()
+            for worker_id, (process, _) in list(self._workers.items()):
+                with self._lock:
+                    current = self._current.get(worker_id)
+                stuck = current is not None and now - current[1] > self.request_timeout
+                if process.is_alive() and not stuck:
+                    continue
+                if stuck:
+                    process.kill()
+                process.join(timeout=5)
+                if self._closed:
+                    return
+                self._restart(worker_id, current)
+
+    def _restart(self, worker_id, current):
+        with self._idle_changed:
+            if worker_id not in self._ready:
+                self._failed_starts += 1
+            self._ready.discard(worker_id)
+            self._idle.discard(worker_id)
+            self._current.pop(worker_id, None)
+            future = self._futures.pop(current[0], None) if current else None
+            self.restarts += 1
+            # Workers that die before loading the model will never come up
+            give_up = self._failed_starts >= 3 * self.n_workers
+            if give_up:
+                self._closed = True
+                failed = list(self._futures.values())
+                self._futures.clear()
+                self._idle_changed.notify_all()
+        if future is not None:
+            future.set_exception(WorkerCrashed(f"model worker {worker_id} died while generating"))
+        if give_up:
+            for pending in failed:
+                pending.set_exception(WorkerCrashed(f"model workers could not load {self.model_path}"))
+            return
+        self._spawn(worker_id)
+
+    def health(self):
+        """Per-worker status plus aggregate throughput."""
+        with self._lock:
+            workers = {
+                worker_id: {
+                    "alive": process.is_alive(),
+                    "ready": worker_id in self._ready,
+                    "busy": worker_id in self._current,
+                }
+                for worker_id, (process, _) in self._workers.items()
+            }
+            elapsed = time.perf_counter() - self._started_at
+            return {
+                "workers": workers,
+                "queued": len(self._futures) - len(self._current),
+                "completed": self.completed,
+                "restarts": self.restarts,
+                "tokens_per_sec": self.tokens / elapsed if elapsed else 0.0,
+            }
+
+    def close(self):
+        """Stop the workers; requests still queued or running fail with WorkerCrashed."""
+        with self._idle_changed:
+            self._closed = True
+            pending = list(self._futures.values())
+            self._futures.clear()
+            self._idle_changed.notify_all()
+        for future in pending:
+            future.set_exception(WorkerCrashed("worker pool closed"))
+        self._queue.put(None)
+        for _, tasks in self._workers.values():
+            tasks.put(None)
+        for process, _ in self._workers.values():
+            process.join(timeout=5)
+            if process.is_alive():
+                process.kill()
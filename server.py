@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Headless OpenAI-compatible HTTP server in front of YashBot's backends.
+
+    python server.py --port 8000
+    curl http://127.0.0.1:8000/v1/chat/completions \\
+        -d '{"model": "offline", "messages": [{"role": "user", "content": "Hi"}]}'
+
+Each backend has its own admission queue (see core/admission.py): a
+concurrency limit, a bounded queue served round-robin across clients,
+429 for a client with too many requests waiting and 503 with Retry-After
+when the queue is full.
+"""
+import argparse
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv
+
+from core import tracing
+from core.admission import AdmissionQueue, Rejected
+from core.backends import BACKENDS, get_backend
+from core import coalesce
+from core.coalesce import coalescing_enabled, get_coalescer
+from models.llm_interface import estimate_tokens
+
+load_dotenv()
+
+def _int_env(name, default):
+    return int(os.getenv(name, str(default)))
+
+def default_concurrency(backend):
+    """How many requests a backend may run at once (YASHBOT_SERVER_CONCURRENCY_<BACKEND>)."""
+    if backend == "online":
+        default = 8
+    else:
+        # Offline (and hybrid, which may fall back to it) share one model per worker
+        default = max(1, _int_env("YASHBOT_OFFLINE_WORKERS", 0))
+    return _int_env(f"YASHBOT_SERVER_CONCURRENCY_{backend.upper()}", default)
+
+def build_prompt(messages):
+    """
+    The backends take a single prompt, so earlier messages in the request
+    are passed as context in front of the last user message.
+    """
+    messages = [m for m in messages if isinstance(m, dict) and m.get("content")]
+    if not messages:
+        return ""
+    *earlier, last = messages
+    if not earlier:
+        return str(last["content"])
+    lines = []
+    for m in earlier:
+        role = {"system": "Instructions", "assistant": "Assistant"}.get(m.get("role"), "User")
+        lines.append(f"{role}: {m['content']}")
+    return "Conversation so far:\n" + "\n".join(lines) + f"\n\n{last['content']}"
+
+def generation_options(request):
+    """
+    The request's temperature / max_tokens / stop as backend keyword
+    arguments (absent fields keep the backend's defaults). Raises
+    ValueError for values the backends can't take.
+    """
+    options = {}
+    temperature = request.get("temperature")
+    if temperature is not None:
+        if isinstance(temperature, bool) or not isinstance(temperature, (int, float)) or not 0 <= temperature <= 2:
+            raise ValueError("temperature must be a number between 0 and 2")
+        options["temperature"] = float(temperature)
+    max_tokens = request.get("max_tokens")
+    if max_tokens is not None:
+        if isinstance(max_tokens, bool) or not isinstance(max_tokens, int) or max_tokens < 1:
+            raise ValueError("max_tokens must be a positive integer")
+        options["max_tokens"] = max_tokens
+    stop = request.get("stop")
+    if stop is not None:
+        stop = [stop] if isinstance(stop, str) else stop
+        if not isinstance(stop, list) or len(stop) > 4 or not all(isinstance(s, str) and s for s in stop):
+            raise ValueError("stop must be a string or a list of up to 4 strings")
+        options["stop"] = stop
+    return options
+
+@contextlib.contextmanager
+def admitted(queue, client):
+    """Hold one of the queue's slots (waiting for it) while the block runs."""
+    with tracing.span("queue"):
+        queue.acquire(client)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        queue.release(time.perf_counter() - start)
+
+def coalescer_stats():
+    """Calls made and requests that shared one, for the backends that coalesce."""
+    return {name: get_coalescer(name).stats() for name, entry in BACKENDS.items() if "cache_params" in entry}
+
+class ChatServerHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def client_id(self):
+        """Who to be fair between: X-Client-Id, else the API key, else the address."""
+        client = self.headers.get("X-Client-Id")
+        if not client:
+            auth = self.headers.get("Authorization", "")
+            client = auth[7:] if auth.startswith("Bearer ") else self.client_address[0]
+        return client
+
+    def authorized(self):
+        key = self.server.api_key
+        return not key or self.headers.get("Authorization") == f"Bearer {key}"
+
+    def do_GET(self):
+        path = self.path.split("?")[0].rstrip("/")
+        if path == "/v1/models":
+            now = int(time.time())
+            return self.send_json(200, {"object": "list", "data": [
+                {"id": name, "object": "model", "created": now, "owned_by": "yashbot"}
+                for name in BACKENDS
+            ]})
+        if path == "/health":
+            return self.send_json(200, {"status": "ok", "queues": self.server.stats(),
+                                        "coalesced": coalescer_stats()})
+        if path == "/metrics":
+            data = tracing.prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            return self.wfile.write(data)
+        self.send_error_json(404, "not found")
+
+    def do_POST(self):
+        if self.path.split("?")[0].rstrip("/") != "/v1/chat/completions":
+            return self.send_error_json(404, "not found")
+        if not self.authorized():
+            return self.send_error_json(401, "invalid API key")
+        try:
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            request = json.loads(body or b"{}")
+            messages = request["messages"]
+        except (ValueError, KeyError, TypeError):
+            return self.send_error_json(400, "expected a JSON body with a messages list")
+
+        backend, model = self.server.resolve(request.get("model"))
+        prompt = build_prompt(messages)
+        if not prompt:
+            return self.send_error_json(400, "messages has no content")
+        try:
+            options = generation_options(request)
+        except ValueError as e:
+            return self.send_error_json(400, str(e))
+
+        queue = self.server.queues[backend]
+        admit = functools.partial(admitted, queue, self.client_id())
+        with tracing.trace("http", mode=backend) as turn:
+            try:
+                # The options are part of the cache and coalescing keys
+                kwargs = {"remember": False, **options}
+                if model:
+                    kwargs["model"] = model
+                send = self.send_stream if request.get("stream") else self.send_completion
+                if "cache_params" in BACKENDS[backend] and coalescing_enabled():
+                    # Admitted behind the cache and coalescer: cache hits and
+                    # requests joining an identical one in flight take no slot
+                    token = coalesce.admission.set(admit)
+                    try:
+                        send(backend, request.get("model") or backend, prompt, kwargs)
+                    finally:
+                        coalesce.admission.reset(token)
+                else:
+                    with admit():
+                        send(backend, request.get("model") or backend, prompt, kwargs)
+            except Rejected as e:
+                turn.set(rejected=e.status)
+                tracing.metrics.inc("yashbot_http_rejected_total", backend=backend, status=e.status)
+                return self.send_error_json(e.status, str(e), {"Retry-After": str(e.retry_after)})
+
+    def send_completion(self, backend, model_name, prompt, kwargs):
+        reply = get_backend(backend)(prompt, **kwargs)
+        if reply.startswith("⚠"):
+            return self.send_error_json(502, reply)
+        prompt_tokens, reply_tokens = estimate_tokens(prompt), estimate_tokens(reply)
+        self.send_json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model_name,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": reply},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": reply_tokens,
+                      "total_tokens": prompt_tokens + reply_tokens},
+        })
+
+    def send_stream(self, backend, model_name, prompt, kwargs):
+        chunks = get_backend(backend, stream=True)(prompt, **kwargs)
+        try:
+            # Errors arrive as the first chunk; report them with a status code
+            # while the headers haven't gone out yet
+            first = next(chunks, "")
+            if first.startswith("⚠"):
+                return self.send_error_json(502, first)
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            base = {"id": f"chatcmpl-{uuid.uuid4().hex}", "object": "chat.completion.chunk",
+                    "created": int(time.time()), "model": model_name}
+            self.write_event({**base, "choices": [{"index": 0, "delta": {"role": "assistant"},
+                                                   "finish_reason": None}]})
+            if first:
+                self.write_event({**base, "choices": [{"index": 0, "delta": {"content": first},
+                                                       "finish_reason": None}]})
+            for chunk in chunks:
+                self.write_event({**base, "choices": [{"index": 0, "delta": {"content": chunk},
+                                                       "finish_reason": None}]})
+            self.write_event({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            self.write_chunk(b"data: [DONE]\n\n")
+            self.write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # Client went away: stop generating and free the slot
+            self.close_connection = True
+        finally:
+            chunks.close()
+
+    def write_event(self, payload):
+        self.write_chunk(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode())
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def send_json(self, status, payload, headers=None):
+        data = json.dumps(payload, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_error_json(self, status, message, headers=None):
+        self.send_json(status, {"error": {"message": message, "code": status}}, headers)
+
+class ChatServer(ThreadingHTTPServer):
+    """
+    Serves /v1/chat/completions, /v1/models, /health and /metrics.
+    The request's "model" picks the backend ("online", "offline",
+    "hybrid"); anything else is taken as an OpenRouter model id.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=8000, backend="offline", max_queue=16,
+                 per_client=4, queue_timeout=30.0, concurrency=None, api_key=None, verbose=False):
+        super().__init__((host, port), ChatServerHandler)
+        self.backend = backend
+        self.api_key = api_key
+        self.verbose = verbose
+        concurrency = concurrency or {}
+        self.queues = {
+            name: AdmissionQueue(concurrency.get(name) or default_concurrency(name),
+                                 max_queue, per_client, queue_timeout)
+            for name in BACKENDS
+        }
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def resolve(self, model):
+        """Request "model" -> (backend, OpenRouter model id or None)."""
+        if not model or model in ("yashbot", "default"):
+            return self.backend, None
+        name = model[len("yashbot-"):] if model.startswith("yashbot-") else model
+        if name in BACKENDS:
+            return name, None
+        return "online", model
+
+    def stats(self):
+        return {name: queue.stats() for name, queue in self.queues.items()}
+
+    def start(self):
+        """Serve from a background thread (handy in scripts and tests)."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OpenAI-compatible HTTP server for YashBot")
+    parser.add_argument("--host", default=os.getenv("YASHBOT_SERVER_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=_int_env("YASHBOT_SERVER_PORT", 8000))
+    parser.add_argument("--backend", choices=list(BACKENDS), default=os.getenv("YASHBOT_SERVER_BACKEND", "offline"),
+                        help="backend for requests that don't name one (default: offline)")
+    parser.add_argument("--max-queue", type=int, default=_int_env("YASHBOT_SERVER_MAX_QUEUE", 16),
+                        help="requests waiting per backend before answering 503")
+    parser.add_argument("--per-client", type=int, default=_int_env("YASHBOT_SERVER_PER_CLIENT", 4),
+                        help="requests one client may have waiting before answering 429")
+    parser.add_argument("--queue-timeout", type=float,
+                        default=float(os.getenv("YASHBOT_SERVER_QUEUE_TIMEOUT", "30")),
+                        help="seconds a request may wait for a slot")
+    parser.add_argument("--concurrency", type=int, help="requests run at once by the default backend")
+    parser.add_argument("--quiet", action="store_true", help="don't log each request")
+    args = parser.parse_args(argv)
+
+    server = ChatServer(args.host, args.port, args.backend, args.max_queue, args.per_client,
+                        args.queue_timeout, {args.backend: args.concurrency},
+                        api_key=os.getenv("YASHBOT_SERVER_API_KEY"), verbose=not args.quiet)
+    if args.backend != "online":
+        # Load the local model now rather than on the first request
+        from core.backends import warm_backend
+        warm_backend("offline")
+    print(f"YashBot server listening on {server.base_url} (default backend: {args.backend})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Server stopped.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import json
+import os
+import sys
+import urllib.error
+import urllib.request
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import cache, coalesce, offline_model
+import server as server_module
+
+@pytest.fixture
+def generations(monkeypatch):
+    """Stub the local model: records each generation's options and answers with a fixed line."""
+    calls = []
+
+    def token_stream(prompt, remember, max_tokens, stop, temperature):
+        calls.append({"prompt": prompt, "max_tokens": max_tokens, "stop": stop, "temperature": temperature})
+        yield from ("Paris ", "is ", "the ", "capital.")
+
+    monkeypatch.setattr(offline_model, "_token_stream", token_stream)
+    return calls
+
+@pytest.fixture
+def server(monkeypatch, tmp_path, generations):
+    """A ChatServer on a free port with a fresh response cache and coalescers."""
+    monkeypatch.setenv("YASHBOT_CACHE_PATH", str(tmp_path / "cache.db"))
+    monkeypatch.setattr(cache, "_cache", None)
+    monkeypatch.setattr(coalesce, "_coalescers", {})
+    chat_server = server_module.ChatServer("127.0.0.1", 0, "offline", verbose=False).start()
+    yield chat_server
+    chat_server.shutdown()
+    chat_server.server_close()
+
+def _request(chat_server, body):
+    return urllib.request.Request(chat_server.base_url + "/chat/completions", json.dumps(body).encode(),
+                                  {"Content-Type": "application/json"})
+
+def post(chat_server, body):
+    """POST to /v1/chat/completions; returns (status, JSON body)."""
+    try:
+        with urllib.request.urlopen(_request(chat_server, body), timeout=30) as r:
+            return r.status, json.load(r)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+def post_stream(chat_server, body):
+    """POST a streamed request; returns the data of its server-sent events."""
+    with urllib.request.urlopen(_request(chat_server, body), timeout=30) as r:
+        lines = r.read().decode().splitlines()
+    return [line[len("data: "):] for line in lines if line.startswith("data: ")]
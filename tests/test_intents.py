@@ -0,0 +1,38 @@
+import pytest
+
+from core.intents import get_engine
+
+# Questions for the model that share words with a utility intent
+TO_MODEL = [
+    "tell me a joke about time",
+    "tell me about time travel",
+    "explain memory usage",
+    "what is disk usage",
+    "show me disk usage command",
+    "what is cpu usage",
+    "what is the time complexity of quicksort",
+    "what time is it in new york",
+    "how much ram do i need for gaming",
+]
+
+ANSWERED_LOCALLY = {
+    "what time is it": "time",
+    "hey yashbot, can you tell me the time please?": "time",
+    "what day is it today": "date",
+    "what's my cpu usage": "cpu",
+    "cpu usge": "cpu",
+    "how much ram is free": "memory",
+    "how much storage is left": "disk",
+    "what's the system status": "system",
+}
+
+@pytest.mark.parametrize("query", TO_MODEL)
+def test_model_questions_reach_the_model(query):
+    assert get_engine().answer(query) is None
+
+@pytest.mark.parametrize("query,intent", ANSWERED_LOCALLY.items())
+def test_utility_queries_are_answered_locally(query, intent):
+    engine = get_engine()
+    match, confidence = engine.match(query)
+    assert match is not None and match.name == intent
+    assert confidence >= engine.threshold
@@ -0,0 +1,87 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from core import offline_model
+from core.cache import get_cache
+
+from conftest import post, post_stream
+
+QUESTION = {"messages": [{"role": "user", "content": "What is the capital of France?"}],
+            "temperature": 0.2, "max_tokens": 32, "stop": ["\n"]}
+
+def test_repeat_with_options_is_answered_from_cache(server, generations):
+    first = post(server, QUESTION)
+    second = post(server, QUESTION)
+
+    assert first[0] == second[0] == 200
+    assert second[1]["choices"][0]["message"]["content"] == "Paris is the capital."
+    assert len(generations) == 1
+    assert generations[0]["temperature"] == 0.2 and generations[0]["max_tokens"] == 32
+    assert get_cache().stats()["memory_hits"] == 1
+
+def test_streamed_repeat_with_options_is_answered_from_cache(server, generations):
+    post(server, QUESTION)
+    events = post_stream(server, {**QUESTION, "stream": True})
+
+    assert events[-1] == "[DONE]"
+    content = "".join(json.loads(e)["choices"][0]["delta"].get("content", "") for e in events[:-1])
+    assert content == "Paris is the capital."
+    assert len(generations) == 1
+
+def test_invalid_options_are_rejected(server, generations):
+    status, body = post(server, {**QUESTION, "temperature": "hot"})
+    assert status == 400
+    assert "temperature" in body["error"]["message"]
+    assert not generations
+
+@pytest.fixture
+def slow_model(monkeypatch, generations):
+    """The stub model, taking long enough for other requests to arrive while it runs; returns its started event."""
+    started = threading.Event()
+    stub_stream = offline_model._token_stream
+
+    def slow_stream(*args):
+        started.set()
+        time.sleep(0.5)
+        yield from stub_stream(*args)
+
+    monkeypatch.setattr(offline_model, "_token_stream", slow_stream)
+    return started
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_identical_concurrent_requests_share_one_generation(server, generations, slow_model, monkeypatch, stream):
+    # Caching off, so only coalescing can merge the requests
+    monkeypatch.setenv("YASHBOT_CACHE", "0")
+    send = post_stream if stream else post
+    with ThreadPoolExecutor(3) as pool:
+        first = pool.submit(send, server, {**QUESTION, "stream": stream})
+        assert slow_model.wait(5)
+        others = [pool.submit(send, server, {**QUESTION, "stream": stream}) for _ in range(2)]
+        results = [first.result()] + [f.result() for f in others]
+
+    if stream:
+        replies = ["".join(json.loads(e)["choices"][0]["delta"].get("content", "") for e in events[:-1])
+                   for events in results]
+    else:
+        replies = [body["choices"][0]["message"]["content"] for status, body in results]
+    assert replies == ["Paris is the capital."] * 3
+    assert len(generations) == 1
+    # Only the request that started the generation took a queue slot
+    assert server.stats()["offline"]["served"] == 1
+
+def test_only_new_generations_are_rejected_when_the_queue_is_full(server, generations, slow_model, monkeypatch):
+    monkeypatch.setenv("YASHBOT_CACHE", "0")
+    server.queues["offline"].max_queue = 0
+    other = {**QUESTION, "messages": [{"role": "user", "content": "What is the capital of Spain?"}]}
+    with ThreadPoolExecutor(3) as pool:
+        first = pool.submit(post, server, QUESTION)
+        assert slow_model.wait(5)
+        duplicate, different = pool.submit(post, server, QUESTION), pool.submit(post, server, other)
+        results = first.result(), duplicate.result(), different.result()
+
+    assert [status for status, _ in results] == [200, 200, 503]
+    assert len(generations) == 1
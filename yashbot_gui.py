@@ -1,15 +1,26 @@
 import sys
 import os
+import threading
+import time
+from collections import deque
 from PyQt5.QtWidgets import (
-    QApplication, QWidget, QVBoxLayout, QHBoxLayout, QTextEdit, QLineEdit, QPushButton, 
+    QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QPushButton, 
     QLabel, QComboBox, QMessageBox, QFrame, QSplitter, QScrollArea, QGridLayout,
     QProgressBar, QSlider, QCheckBox, QGroupBox, QTabWidget, QListWidget, QListWidgetItem
 )
-from PyQt5.QtGui import QFont, QColor, QTextCursor, QPalette, QPixmap, QIcon, QPainter, QLinearGradient
-from PyQt5.QtCore import Qt, QTimer, QPropertyAnimation, QEasingCurve, QRect, pyqtProperty
+from PyQt5.QtGui import QFont, QColor, QPalette, QPixmap, QIcon, QPainter, QLinearGradient
+from PyQt5.QtCore import (
+    Qt, QPropertyAnimation, QEasingCurve, QRect, pyqtProperty,
+    QObject, QRunnable, QThreadPool, pyqtSignal
+)
 from dotenv import load_dotenv
-from core.online_model import online_chat
-from core.offline_model import offline_chat
+from core import tracing
+from core.backends import get_backend, warm_backend, reset_backend
+from core.intents import answer_locally
+from core.transcript_store import get_store, transcripts_enabled
+from chat_view import ChatListModel, ChatView, Message
+from models.llm_interface import switch_model
+from models.model_manager import get_manager
 import datetime
 
 # Load environment variables
@@ -34,6 +45,64 @@ class AnimatedButton(QPushButton):
         self._animation.start()
         super().leaveEvent(event)
 
+class ChatWorkerSignals(QObject):
+    chunk = pyqtSignal(str)
+    error = pyqtSignal(str)
+    finished = pyqtSignal()
+
+class ChatWorker(QRunnable):
+    """Runs one streamed chat request off the GUI thread."""
+
+    def __init__(self, chat_stream, prompt, trace=tracing.NOOP):
+        super().__init__()
+        self.chat_stream = chat_stream
+        self.prompt = prompt
+        self.trace = trace
+        self.signals = ChatWorkerSignals()
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def run(self):
+        stream = None
+        try:
+            with self.trace.activate():
+                stream = self.chat_stream(self.prompt)
+                for chunk in stream:
+                    if self.cancelled:
+                        break
+                    self.signals.chunk.emit(chunk)
+        except Exception as e:
+            self.signals.error.emit(str(e))
+        finally:
+            # Closing the generator aborts the HTTP stream / local generation
+            if stream is not None and hasattr(stream, "close"):
+                with self.trace.activate():
+                    stream.close()
+            self.signals.finished.emit()
+
+class BackendTask(QRunnable):
+    """Runs a blocking backend call (e.g. a reset) off the GUI thread."""
+
+    def __init__(self, func, *args):
+        super().__init__()
+        self.func = func
+        self.args = args
+        self.signals = ChatWorkerSignals()
+
+    def run(self):
+        try:
+            self.func(*self.args)
+        except Exception as e:
+            self.signals.error.emit(str(e))
+        finally:
+            self.signals.finished.emit()
+
 class ChatBubble(QFrame):
     def __init__(self, text, is_user=True, parent=None):
         super().__init__(parent)
@@ -78,8 +147,21 @@ class YashBotGUI(QWidget):
         self.setWindowTitle("YashBot - AI Assistant")
         self.setGeometry(100, 100, 1000, 700)
         self.setMinimumSize(800, 600)
-        self.chat_history = []
         self.chat_model = None
+        self.chat_stream = None
+        self.mode = None
+        self.thread_pool = QThreadPool.globalInstance()
+        self.current_worker = None
+        # A stopped worker only notices on its next chunk; new messages wait
+        # for it (and for a reset after a clear) instead of racing it
+        self.stopping_worker = None
+        self.reset_pending = None   # mode to reset once stopping_worker is done
+        self.resetting = False
+        self.reset_task = None
+        self.pending_messages = deque()
+        # Every conversation is saved; a new session starts with the first message after a clear
+        self.store = get_store() if transcripts_enabled() else None
+        self.session = None
         self.init_ui()
         self.select_mode()
         self.setup_animations()
@@ -149,8 +231,9 @@ class YashBotGUI(QWidget):
         
         self.online_btn = AnimatedButton("🌐 Online Mode")
         self.offline_btn = AnimatedButton("💻 Offline Mode")
+        self.hybrid_btn = AnimatedButton("⚡ Hybrid Mode")
         
-        for btn in [self.online_btn, self.offline_btn]:
+        for btn in [self.online_btn, self.offline_btn, self.hybrid_btn]:
             btn.setStyleSheet("""
                 QPushButton {
                     background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
@@ -175,6 +258,7 @@ class YashBotGUI(QWidget):
         
         self.online_btn.clicked.connect(lambda: self.set_mode("online"))
         self.offline_btn.clicked.connect(lambda: self.set_mode("offline"))
+        self.hybrid_btn.clicked.connect(lambda: self.set_mode("hybrid"))
         sidebar_layout.addWidget(mode_group)
         
         # Settings
@@ -192,6 +276,26 @@ class YashBotGUI(QWidget):
         settings_layout = QVBoxLayout()
         settings_group.setLayout(settings_layout)
         
+        # Local model (switched without a restart; loads in the background)
+        model_label = QLabel("Local model")
+        model_label.setStyleSheet("color: #f8f8f2; font-size: 12px;")
+        self.model_combo = QComboBox()
+        self.model_combo.setStyleSheet("""
+            QComboBox {
+                background: #2d3748;
+                color: #f8f8f2;
+                border: 1px solid #4a5568;
+                border-radius: 4px;
+                padding: 4px;
+            }
+        """)
+        manager = get_manager()
+        self.model_combo.addItems(list(manager.specs))
+        self.model_combo.setCurrentText(manager.active)
+        self.model_combo.activated[str].connect(self.switch_local_model)
+        settings_layout.addWidget(model_label)
+        settings_layout.addWidget(self.model_combo)
+
         # Temperature slider
         temp_label = QLabel("Temperature: 0.7")
         temp_label.setStyleSheet("color: #f8f8f2; font-size: 12px;")
@@ -221,6 +325,50 @@ class YashBotGUI(QWidget):
         settings_layout.addWidget(self.temp_slider)
         sidebar_layout.addWidget(settings_group)
         
+        # Saved conversations, searchable
+        if self.store is not None:
+            history_group = QGroupBox("History")
+            history_group.setStyleSheet("""
+                QGroupBox {
+                    color: #f8f8f2;
+                    font-weight: bold;
+                    border: 1px solid #4a5568;
+                    border-radius: 8px;
+                    margin-top: 10px;
+                    padding-top: 10px;
+                }
+            """)
+            history_layout = QVBoxLayout()
+            history_group.setLayout(history_layout)
+            self.history_search = QLineEdit()
+            self.history_search.setPlaceholderText("Search past chats...")
+            self.history_search.setStyleSheet("""
+                QLineEdit {
+                    background: #2d3748;
+                    color: #f8f8f2;
+                    border: 1px solid #4a5568;
+                    border-radius: 4px;
+                    padding: 4px;
+                }
+            """)
+            self.history_search.returnPressed.connect(self.refresh_history)
+            self.history_list = QListWidget()
+            self.history_list.setStyleSheet("""
+                QListWidget {
+                    background: #2d3748;
+                    color: #f8f8f2;
+                    border: 1px solid #4a5568;
+                    border-radius: 4px;
+                    font-size: 11px;
+                }
+            """)
+            self.history_list.itemClicked.connect(
+                lambda item: self.open_session(item.data(Qt.UserRole)))
+            history_layout.addWidget(self.history_search)
+            history_layout.addWidget(self.history_list)
+            sidebar_layout.addWidget(history_group)
+            self.refresh_history()
+
         # Spacer
         sidebar_layout.addStretch()
         
@@ -253,6 +401,11 @@ class YashBotGUI(QWidget):
         self.chat_title.setStyleSheet("color: #8be9fd;")
         header_layout.addWidget(self.chat_title)
         
+        # Messages waiting for the current response to finish
+        self.queue_label = QLabel("")
+        self.queue_label.setStyleSheet("color: #ffb86c; font-size: 12px;")
+        header_layout.addWidget(self.queue_label)
+        
         # Clear chat button
         clear_btn = AnimatedButton("🗑️ Clear")
         clear_btn.setStyleSheet("""
@@ -268,22 +421,24 @@ class YashBotGUI(QWidget):
                 background: #ff6b6b;
             }
         """)
-        clear_btn.clicked.connect(self.clear_chat)
+        clear_btn.clicked.connect(lambda: self.clear_chat())
         header_layout.addWidget(clear_btn)
         
         chat_layout.addWidget(header)
         
-        # Chat display
-        self.chat_display = QTextEdit()
-        self.chat_display.setReadOnly(True)
+        # Chat display: a virtualized list, older messages page out to a temp store
+        self.transcript = ChatListModel(
+            memory_cap=int(os.getenv("YASHBOT_GUI_MEMORY_CAP", "200")),
+            page_size=int(os.getenv("YASHBOT_GUI_PAGE_SIZE", "50")),
+        )
+        self.chat_display = ChatView(self.transcript)
         self.chat_display.setFont(QFont("Segoe UI", 12))
         self.chat_display.setStyleSheet("""
-            QTextEdit {
+            QListView {
                 background-color: #1a202c;
                 color: #f8f8f2;
                 border: none;
-                padding: 20px;
-                line-height: 1.6;
+                padding: 10px 0;
             }
         """)
         chat_layout.addWidget(self.chat_display, 1)
@@ -337,8 +492,31 @@ class YashBotGUI(QWidget):
         """)
         self.send_btn.clicked.connect(self.send_message)
         
+        self.stop_btn = AnimatedButton("⏹ Stop")
+        self.stop_btn.setStyleSheet("""
+            QPushButton {
+                background: #ff5555;
+                color: white;
+                border: none;
+                border-radius: 8px;
+                padding: 12px 20px;
+                font-size: 14px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background: #ff6b6b;
+            }
+            QPushButton:disabled {
+                background: #4a5568;
+                color: #6272a4;
+            }
+        """)
+        self.stop_btn.setEnabled(False)
+        self.stop_btn.clicked.connect(self.stop_generation)
+        
         input_layout.addWidget(self.input_box, 1)
         input_layout.addWidget(self.send_btn)
+        input_layout.addWidget(self.stop_btn)
         chat_layout.addWidget(input_frame)
 
     def apply_dark_theme(self):
@@ -360,84 +538,244 @@ class YashBotGUI(QWidget):
 
     def set_mode(self, mode):
         if mode == "online":
-            self.chat_model = online_chat
+            self.mode = "online"
+            self.chat_model = get_backend("online")
+            self.chat_stream = get_backend("online", stream=True)
             self.status_label.setText("● Online")
             self.status_label.setStyleSheet("color: #50fa7b; font-size: 12px; margin: 10px;")
             self.append_system_message("✅ Switched to Online mode (OpenRouter API)")
+        elif mode == "hybrid":
+            self.mode = "hybrid"
+            self.chat_model = get_backend("hybrid")
+            self.chat_stream = get_backend("hybrid", stream=True)
+            # Offline is the fallback, so have it ready
+            warm_backend("offline")
+            self.status_label.setText("● Hybrid")
+            self.status_label.setStyleSheet("color: #8be9fd; font-size: 12px; margin: 10px;")
+            self.append_system_message("✅ Switched to Hybrid mode (fastest healthy backend, offline fallback)")
         else:
-            self.chat_model = offline_chat
+            self.mode = "offline"
+            self.chat_model = get_backend("offline")
+            self.chat_stream = get_backend("offline", stream=True)
+            # Load the local model in the background while the user types
+            warm_backend("offline")
             self.status_label.setText("● Offline")
             self.status_label.setStyleSheet("color: #ffb86c; font-size: 12px; margin: 10px;")
             self.append_system_message("✅ Switched to Offline mode (local GPT4All)")
 
+    def switch_local_model(self, name):
+        manager = get_manager()
+        if name == manager.active:
+            return
+        state = "already loaded" if manager.is_loaded(name) else "loading in the background"
+        switch_model(name)
+        self.append_system_message(f"🔁 Switching local model to {name} ({state})")
+
     def select_mode(self):
         # Auto-select online mode by default
         self.set_mode("online")
 
+    def save_message(self, role, text):
+        if self.store is None:
+            return
+        if self.session is None:
+            self.session = self.store.start_session(self.mode or "", "gui")
+        self.store.add(self.session, role, text)
+
+    def refresh_history(self):
+        """List recent conversations, or the messages matching the search box."""
+        self.store.flush()
+        self.history_list.clear()
+        query = self.history_search.text().strip()
+        if query:
+            entries = [(hit["session"], f"{hit['snippet']}", hit["time"])
+                       for hit in self.store.search(query, limit=50)]
+        else:
+            entries = [(session["id"], session["title"] or "(no question)", session["started"])
+                       for session in self.store.sessions(limit=50)]
+        for session, text, when in entries:
+            stamp = time.strftime("%m-%d %H:%M", time.localtime(when))
+            item = QListWidgetItem(f"{stamp}  {text[:80]}")
+            item.setData(Qt.UserRole, session)
+            item.setToolTip(text)
+            self.history_list.addItem(item)
+
+    def open_session(self, session):
+        """Show a saved conversation, loading older pages as the user scrolls up."""
+        self.store.flush()
+
+        def fetch(cursor, limit):
+            rows, cursor = self.store.page(session, cursor, limit)
+            return [Message("bot" if role == "assistant" else role, text,
+                            time.strftime("%H:%M", time.localtime(when)))
+                    for _, role, text, when in rows], cursor
+
+        self.clear_chat(announce=False)
+        self.transcript.load_history(fetch)
+        self.chat_display.follow()
+        self.append_system_message("📜 Saved conversation. New messages start a new one")
+
     def append_system_message(self, message):
-        timestamp = datetime.datetime.now().strftime("%H:%M")
-        self.chat_display.append(f'<div style="text-align: center; color: #6272a4; font-size: 12px; margin: 10px 0;">{message} • {timestamp}</div>')
-        self.chat_display.moveCursor(QTextCursor.End)
+        return self.transcript.append("system", message)
 
     def append_user_message(self, message):
-        timestamp = datetime.datetime.now().strftime("%H:%M")
-        self.chat_display.append(f'''
-            <div style="text-align: right; margin: 10px 0;">
-                <div style="display: inline-block; background: #6272a4; color: #f8f8f2; padding: 10px 15px; border-radius: 15px; max-width: 70%;">
-                    {message}
-                </div>
-                <div style="color: #6272a4; font-size: 11px; margin-top: 5px;">{timestamp}</div>
-            </div>
-        ''')
-        self.chat_display.moveCursor(QTextCursor.End)
+        self.chat_display.follow()
+        return self.transcript.append("user", message)
 
     def append_bot_message(self, message):
-        timestamp = datetime.datetime.now().strftime("%H:%M")
-        self.chat_display.append(f'''
-            <div style="text-align: left; margin: 10px 0;">
-                <div style="display: inline-block; background: #44475a; color: #f8f8f2; padding: 10px 15px; border-radius: 15px; max-width: 70%;">
-                    {message}
-                </div>
-                <div style="color: #6272a4; font-size: 11px; margin-top: 5px;">{timestamp}</div>
-            </div>
-        ''')
-        self.chat_display.moveCursor(QTextCursor.End)
+        return self.transcript.append("bot", message)
+
+    def update_bot_message(self, chunk):
+        start = time.perf_counter()
+        self._stream_text += chunk
+        self.transcript.update(self._stream_message, self._stream_text)
+        self._render_seconds += time.perf_counter() - start
 
     def send_message(self):
         user_input = self.input_box.text().strip()
         if not user_input:
             return
         
-        self.append_user_message(user_input)
         self.input_box.clear()
-        QApplication.processEvents()
-        
-        # Show typing indicator
-        self.chat_display.append('<div style="text-align: left; margin: 10px 0;"><div style="display: inline-block; background: #44475a; color: #f8f8f2; padding: 10px 15px; border-radius: 15px;">🤖 Thinking...</div></div>')
-        self.chat_display.moveCursor(QTextCursor.End)
-        QApplication.processEvents()
         
-        # Get bot response
-        try:
-            if self.chat_model:
-                response = self.chat_model(user_input)
-            else:
-                response = "⚠ Please select a mode first!"
-        except Exception as e:
-            response = f"⚠ Error: {e}"
+        # Queue follow-ups while a response is still being generated
+        if self.busy():
+            self.pending_messages.append(user_input)
+            self.update_queue_label()
+            return
         
-        # Remove typing indicator and add response
-        cursor = self.chat_display.textCursor()
-        cursor.movePosition(QTextCursor.End)
-        cursor.movePosition(QTextCursor.StartOfLine, QTextCursor.KeepAnchor)
-        cursor.removeSelectedText()
-        cursor.deletePreviousChar()  # Remove the extra newline
+        self.start_generation(user_input)
+
+    def busy(self):
+        return self.current_worker is not None or self.stopping_worker is not None or self.resetting
+
+    def start_pending(self):
+        if self.pending_messages and not self.busy():
+            self.start_generation(self.pending_messages.popleft())
+
+    def update_queue_label(self):
+        count = len(self.pending_messages)
+        self.queue_label.setText(f"⏳ {count} queued" if count else "")
+
+    def start_generation(self, user_input):
+        self.append_user_message(user_input)
+        self.save_message("user", user_input)
+        self.update_queue_label()
+
+        self._trace = tracing.start("chat", mode=self.mode or "", ui="gui")
+        self._render_start = (time.perf_counter(), self.chat_display.paint_seconds)
+        self._render_seconds = 0.0
+
+        # Utility questions (time, date, CPU, RAM, disk) are answered without a model
+        with self._trace.activate(), tracing.span("intent") as span:
+            local_answer = answer_locally(user_input)
+            span.set(hit=local_answer is not None)
+        if local_answer is not None:
+            self.append_bot_message(local_answer)
+            self.save_message("assistant", local_answer)
+            self._trace.finish()
+            self.start_pending()
+            return
+
+        if not self.chat_stream:
+            self.append_bot_message("⚠ Please select a mode first!")
+            self._trace.finish()
+            return
         
-        self.append_bot_message(response)
+        # The reply's bubble shows a typing indicator until the first chunk arrives
+        self._stream_message = self.append_bot_message("🤖 Thinking...")
+        self._stream_text = ""
+        self._waiting_first_chunk = True
+        
+        worker = ChatWorker(self.chat_stream, user_input, self._trace)
+        worker.signals.chunk.connect(lambda chunk, w=worker: self.on_worker_chunk(w, chunk))
+        worker.signals.error.connect(lambda message, w=worker: self.on_worker_chunk(w, f"⚠ Error: {message}"))
+        worker.signals.finished.connect(lambda w=worker: self.on_worker_finished(w))
+        self.current_worker = worker
+        self.stop_btn.setEnabled(True)
+        self.thread_pool.start(worker)
 
-    def clear_chat(self):
-        self.chat_display.clear()
-        self.append_system_message("Chat cleared")
+    def on_worker_chunk(self, worker, chunk):
+        # Ignore late output from a worker that was stopped
+        if worker is not self.current_worker:
+            return
+        self._waiting_first_chunk = False
+        self.update_bot_message(chunk)
+
+    def on_worker_finished(self, worker):
+        if worker is self.stopping_worker:
+            self.stopping_worker = None
+            if self.reset_pending:
+                self.start_reset()
+            else:
+                self.start_pending()
+            return
+        if worker is not self.current_worker:
+            return
+        self.finish_generation("")
+
+    def finish_generation(self, note):
+        self._waiting_first_chunk = False
+        # The note (e.g. " ⏹ Stopped") is only shown, never saved
+        reply = self._stream_text
+        if note or not reply:
+            self.update_bot_message(note)
+        # Render = updating the transcript model plus painting the view
+        started, painted = self._render_start
+        render = self._render_seconds + self.chat_display.paint_seconds - painted
+        self._trace.record("render", render, started)
+        self._trace.finish(stopped=bool(note))
+        if reply and not reply.startswith("⚠"):
+            self.save_message("assistant", reply)
+        self.current_worker = None
+        self.stop_btn.setEnabled(False)
+        self.start_pending()
+
+    def stop_generation(self):
+        worker = self.current_worker
+        if worker is None:
+            return
+        worker.cancel()
+        self.stopping_worker = worker
+        self.finish_generation(" ⏹ Stopped")
+
+    def clear_chat(self, announce=True):
+        self.pending_messages.clear()
+        self.update_queue_label()
+        if self.current_worker is not None:
+            self.current_worker.cancel()
+            self.stopping_worker = self.current_worker
+            self._trace.finish(cancelled=True)
+            self.current_worker = None
+            self.stop_btn.setEnabled(False)
+        self.transcript.clear()
+        if self.mode:
+            # The backend is reset on the thread pool once the stopped worker
+            # has let go of it, so the GUI never waits on a generation
+            self.reset_pending = self.mode
+            if self.stopping_worker is None and not self.resetting:
+                self.start_reset()
+        if self.store is not None:
+            self.session = None
+            self.refresh_history()
+        if announce:
+            self.append_system_message("Chat cleared")
+
+    def start_reset(self):
+        task = BackendTask(reset_backend, self.reset_pending)
+        self.reset_pending = None
+        self.resetting = True
+        task.signals.error.connect(lambda message: self.append_system_message(f"⚠ Reset failed: {message}"))
+        task.signals.finished.connect(self.on_reset_finished)
+        self.reset_task = task
+        self.thread_pool.start(task)
+
+    def on_reset_finished(self):
+        self.resetting = False
+        if self.reset_pending:
+            self.start_reset()
+        else:
+            self.start_pending()
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)